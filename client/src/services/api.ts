@@ -9,6 +9,68 @@ const api = axios.create({
   }
 });
 
+// Reads a Server-Sent Events response body, calling onToken for each token.
+// Resolves with the full response text once the server sends "done".
+async function readEventStream(response: Response, onToken: (token: string) => void) {
+  if (!response.ok || !response.body) {
+    throw new Error(`Streaming request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let fullText = '';
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) {
+      return fullText;
+    }
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+
+      let event = 'message';
+      let data = '';
+      for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event: ')) {
+          event = line.slice('event: '.length);
+        } else if (line.startsWith('data: ')) {
+          data += line.slice('data: '.length);
+        }
+      }
+      const payload = data ? JSON.parse(data) : {};
+
+      if (event === 'error') {
+        throw new Error(payload.error || 'Streaming request failed');
+      }
+      if (event === 'done') {
+        await reader.cancel();
+        return fullText;
+      }
+      fullText += payload.token;
+      onToken(payload.token);
+    }
+  }
+}
+
+async function postEventStream(url: string, body: object, onToken: (token: string) => void) {
+  const response = await fetch(url, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      'Accept': 'text/event-stream'
+    },
+    credentials: 'include',
+    body: JSON.stringify({ ...body, stream: true })
+  });
+  return readEventStream(response, onToken);
+}
+
 export const chatService = {
   async sendMessage(message: string, nodeData: any) {
     try {
@@ -39,9 +101,34 @@ export const chatService = {
       console.error('Error sending global message:', error);
       throw error;
     }
+  },
+
+  async streamMessage(message: string, nodeData: any, onToken: (token: string) => void) {
+    try {
+      return await postEventStream('http://localhost:5000/chat-with-chunk', {
+        query: message,
+        node_data: nodeData
+      }, onToken);
+    } catch (error) {
+      console.error('Error streaming message:', error);
+      throw error;
+    }
+  },
+
+  async streamGlobalMessage(message: string, onToken: (token: string) => void) {
+    try {
+      return await postEventStream('http://localhost:5000/chat', {
+        query: message
+      }, onToken);
+    } catch (error) {
+      console.error('Error streaming global message:', error);
+      throw error;
+    }
   }
 };
 
+const INGEST_POLL_INTERVAL_MS = 2000;
+
 export const documentService = {
   async processDocument(file: File) {
     try {
@@ -55,11 +142,35 @@ export const documentService = {
         withCredentials: true
       });
 
+      // Ingestion runs in the background; wait for the job to finish
+      if (response.data.job_id && response.data.status !== 'completed') {
+        return await this.waitForIngestJob(response.data.job_id);
+      }
       return response.data;
     } catch (error) {
       console.error('Error processing document:', error);
       throw error;
     }
+  },
+
+  async getIngestJob(jobId: string) {
+    const response = await axios.get(`http://localhost:5000/ingest/${jobId}`, {
+      withCredentials: true
+    });
+    return response.data;
+  },
+
+  async waitForIngestJob(jobId: string) {
+    for (;;) {
+      const job = await this.getIngestJob(jobId);
+      if (job.status === 'completed') {
+        return job;
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Document ingestion failed');
+      }
+      await new Promise((resolve) => setTimeout(resolve, INGEST_POLL_INTERVAL_MS));
+    }
   }
 };
 
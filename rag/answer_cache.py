@@ -0,0 +1,208 @@
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Constants
+answer_cache_path = "./db/answer_cache.db"
+# Minimum cosine similarity between questions for a cached answer to be reused
+answer_cache_threshold = float(os.environ.get("ANSWER_CACHE_THRESHOLD", 0.95))
+answer_cache_ttl = int(os.environ.get("ANSWER_CACHE_TTL_SECONDS", 24 * 60 * 60))
+answer_cache_max_entries = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", 512))
+
+
+class AnswerCache:
+    """
+    Per-collection cache of chat answers, looked up by question similarity.
+
+    Each entry holds a normalized question embedding and its answer. A new
+    question reuses the answer of the most similar cached question in the
+    same collection and retrieval mode if their cosine similarity reaches
+    `threshold` and the entry is younger than `ttl` seconds. Entries are
+    stored in SQLite and mirrored in memory per collection and mode; the
+    mirror is reloaded whenever the stored entries change, including from
+    another process. Each collection keeps at most `max_entries` answers,
+    dropping the oldest first.
+
+    Every collection also has a generation that invalidate() increments.
+    Callers read it with generation() before computing an answer and pass it
+    to put(), which drops the answer if the collection was invalidated in
+    the meantime.
+    """
+
+    def __init__(self, db_path=answer_cache_path, threshold=answer_cache_threshold,
+                 ttl=answer_cache_ttl, max_entries=answer_cache_max_entries):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _init_db(self):
+        """Initialize the database with required tables."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS answer_cache (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    collection_name TEXT,
+                    query TEXT,
+                    embedding BLOB,
+                    answer TEXT,
+                    created_at REAL
+                )
+            """)
+            # Entries from before answers were cached per mode have no mode and are never matched
+            cursor.execute("PRAGMA table_info(answer_cache)")
+            if "mode" not in [row[1] for row in cursor.fetchall()]:
+                cursor.execute("ALTER TABLE answer_cache ADD COLUMN mode TEXT")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_answer_cache_collection ON answer_cache (collection_name, id)")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS answer_cache_generations (
+                    collection_name TEXT PRIMARY KEY,
+                    generation INTEGER
+                )
+            """)
+            conn.commit()
+
+    @staticmethod
+    def _generation(cursor, collection_name):
+        cursor.execute(
+            "SELECT generation FROM answer_cache_generations WHERE collection_name = ?",
+            (collection_name,)
+        )
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def generation(self, collection_name):
+        """Return the collection's generation, to pass to put() once the answer is ready."""
+        with sqlite3.connect(self.db_path) as conn:
+            return self._generation(conn.cursor(), collection_name)
+
+    def _load(self, collection_name, mode):
+        """Return (created_at, embeddings, answers) for a collection and mode, or None if empty."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT COUNT(*), MAX(id) FROM answer_cache WHERE collection_name = ? AND mode = ?",
+                (collection_name, mode)
+            )
+            signature = cursor.fetchone()
+            with self._lock:
+                cached = self._entries.get((collection_name, mode))
+            if cached and cached[0] == signature:
+                return cached[1]
+
+            cursor.execute(
+                "SELECT embedding, answer, created_at FROM answer_cache WHERE collection_name = ? AND mode = ? ORDER BY id",
+                (collection_name, mode)
+            )
+            rows = cursor.fetchall()
+
+        entries = None
+        if rows:
+            entries = (
+                np.array([created_at for _, _, created_at in rows]),
+                np.stack([np.frombuffer(embedding, dtype=np.float32) for embedding, _, _ in rows]),
+                [answer for _, answer, _ in rows],
+            )
+        with self._lock:
+            self._entries[(collection_name, mode)] = (signature, entries)
+        return entries
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1)
+
+    def get(self, collection_name, embedding, mode=None):
+        """Return the cached answer for a similar question asked in the same mode, or None."""
+        entries = self._load(collection_name, mode)
+        answer = None
+        if entries is not None:
+            created_at, embeddings, answers = entries
+            query_vector = self._normalize(embedding)
+            if embeddings.shape[1] == len(query_vector):
+                scores = embeddings @ query_vector
+                scores[created_at < time.time() - self.ttl] = -np.inf
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    answer = answers[best]
+        with self._lock:
+            if answer is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return answer
+
+    def put(self, collection_name, query, embedding, answer, mode=None, generation=None):
+        """
+        Store an answer and drop expired or excess entries for the collection.
+
+        Args:
+            generation (int): The collection's generation() from before the
+                answer was computed. If the collection has been invalidated
+                since, the answer may be stale and is not stored.
+
+        Returns:
+            bool: Whether the answer was stored.
+        """
+        now = time.time()
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            if generation is not None and self._generation(cursor, collection_name) != generation:
+                conn.rollback()
+                return False
+            cursor.execute(
+                "INSERT INTO answer_cache (collection_name, query, embedding, answer, created_at, mode) VALUES (?, ?, ?, ?, ?, ?)",
+                (collection_name, query, self._normalize(embedding).tobytes(), answer, now, mode)
+            )
+            cursor.execute(
+                "DELETE FROM answer_cache WHERE collection_name = ? AND created_at < ?",
+                (collection_name, now - self.ttl)
+            )
+            cursor.execute("""
+                DELETE FROM answer_cache WHERE collection_name = ? AND id NOT IN (
+                    SELECT id FROM answer_cache WHERE collection_name = ? ORDER BY id DESC LIMIT ?
+                )
+            """, (collection_name, collection_name, self.max_entries))
+            conn.commit()
+        return True
+
+    def invalidate(self, collection_name):
+        """Drop every cached answer for a collection and start its next generation."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("DELETE FROM answer_cache WHERE collection_name = ?", (collection_name,))
+            cursor.execute("""
+                INSERT INTO answer_cache_generations (collection_name, generation) VALUES (?, 1)
+                ON CONFLICT (collection_name) DO UPDATE SET generation = generation + 1
+            """, (collection_name,))
+            conn.commit()
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == collection_name]:
+                del self._entries[key]
+
+    def stats(self):
+        """Return hit/miss counters for this process."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+answer_cache = AnswerCache()
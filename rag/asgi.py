@@ -0,0 +1,218 @@
+"""
+ASGI entry point that serves the LLM-backed endpoints asynchronously.
+
+/roadmap, /quiz, /chat and /chat-with-chunk are served by async handlers that
+await the chains with ainvoke/astream, so pending LLM calls share one event
+loop instead of each holding a thread. Every other route (/ingest, ...) is
+passed through to the Flask app in server.py, so endpoints, cookies and
+response bodies are the same in both serving modes.
+
+Run from the rag/ directory:
+    uvicorn asgi:app --port 5000
+"""
+import asyncio
+import os
+
+from asgiref.wsgi import WsgiToAsgi
+from starlette.applications import Starlette
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.utils import secure_filename
+
+#Local Imports
+import metrics
+import server
+from server import UPLOAD_FOLDER, db_manager, get_upload, quiz_pregenerator, single_flight
+from roadmap import acreate_roadmap
+from chat_with_chunk import achat_with_chunk, astream_chat_with_chunk
+from chat import achat_with_docs, astream_chat_with_docs
+from retrieval import retrieval_modes
+from streaming import asse_stream
+
+
+async def current_document(request):
+    """Return the upload record for the file selected by the current_file cookie."""
+    current_filename = request.cookies.get('current_file')
+    if not current_filename:
+        return None
+    # May hash a legacy upload, so it runs off the event loop like every DBManager call
+    return await asyncio.to_thread(get_upload, secure_filename(current_filename))
+
+def json_response(json_bytes):
+    """Send already-encoded JSON without decoding and re-encoding it."""
+    return Response(json_bytes, media_type='application/json')
+
+def event_stream_response(tokens):
+    """Send an async token generator to the client as Server-Sent Events."""
+    return StreamingResponse(
+        asse_stream(tokens),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+async def request_json(request):
+    """Return the parsed JSON body, or None if it is missing or malformed."""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+async def get_roadmap(request):
+    document = await current_document(request)
+    if not document:
+        return JSONResponse({"error": "No file selected"}, status_code=400)
+
+    stored_roadmap = await asyncio.to_thread(db_manager.get_roadmap_json, document["fingerprint"])
+    if stored_roadmap:
+        return json_response(stored_roadmap)
+
+    async def compute():
+        roadmap = await acreate_roadmap(document["collection_name"])
+        if not roadmap:
+            raise RuntimeError("Failed to create roadmap")
+        await asyncio.to_thread(db_manager.store_roadmap, document["fingerprint"], roadmap)
+        quiz_pregenerator.schedule(document["fingerprint"], document["collection_name"], roadmap)
+        return roadmap
+
+    try:
+        roadmap = await single_flight.ado(
+            f"roadmap:{document['fingerprint']}",
+            compute,
+            lambda: db_manager.get_roadmap(document["fingerprint"]),
+        )
+        return JSONResponse(roadmap)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+async def get_quiz(request):
+    document = await current_document(request)
+    if not document:
+        return JSONResponse({"error": "No file selected"}, status_code=400)
+
+    data = await request_json(request) or {}
+    node_data = data.get('node_data')
+    if not node_data:
+        return JSONResponse({"error": "No node data provided"}, status_code=400)
+
+    try:
+        stored_quiz = await asyncio.to_thread(db_manager.get_quiz_json, document["fingerprint"], node_data['node_id'])
+        if stored_quiz:
+            return json_response(stored_quiz)
+
+        future = quiz_pregenerator.in_flight(document["fingerprint"], document["collection_name"], node_data)
+        if future:
+            quiz = await asyncio.wrap_future(future)
+        else:
+            quiz = await quiz_pregenerator.agenerate(document["fingerprint"], document["collection_name"], node_data)
+        return JSONResponse(quiz)
+    except Exception as e:
+        print(e)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+async def chat_endpoint(request):
+    document = await current_document(request)
+    if not document:
+        return JSONResponse({"error": "No file selected"}, status_code=400)
+
+    data = await request_json(request)
+    if not data:
+        return JSONResponse({"error": "No request data provided"}, status_code=400)
+
+    node_data = data.get('node_data')
+    user_query = data.get('query')
+
+    if not node_data:
+        return JSONResponse({"error": "No node data provided"}, status_code=400)
+    if not user_query:
+        return JSONResponse({"error": "No query provided"}, status_code=400)
+
+    if data.get('stream'):
+        return event_stream_response(astream_chat_with_chunk(user_query, node_data, document["collection_name"]))
+
+    try:
+        response = await achat_with_chunk(user_query, node_data, document["collection_name"])
+        return JSONResponse({"response": response})
+    except Exception as e:
+        print(e)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+async def global_chat_endpoint(request):
+    document = await current_document(request)
+    if not document:
+        return JSONResponse({"error": "No file selected"}, status_code=400)
+
+    data = await request_json(request)
+    if not data:
+        return JSONResponse({"error": "No request data provided"}, status_code=400)
+
+    user_query = data.get('query')
+    if not user_query:
+        return JSONResponse({"error": "No query provided"}, status_code=400)
+
+    mode = data.get('mode')
+    if mode is not None and mode not in retrieval_modes:
+        return JSONResponse({"error": f"Unknown retrieval mode: {mode}"}, status_code=400)
+
+    if data.get('stream'):
+        return event_stream_response(astream_chat_with_docs(user_query, collection_name=document["collection_name"], mode=mode))
+
+    try:
+        response = await achat_with_docs(user_query, collection_name=document["collection_name"], mode=mode)
+        return JSONResponse({"response": response})
+    except Exception as e:
+        print(e)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+routes = [
+    Route('/roadmap', get_roadmap, methods=['GET']),
+    Route('/quiz', get_quiz, methods=['POST']),
+    Route('/chat-with-chunk', chat_endpoint, methods=['POST']),
+    Route('/chat', global_chat_endpoint, methods=['POST']),
+]
+async_paths = {route.path for route in routes}
+
+# Same CORS policy as flask_cors with supports_credentials: reflect the origin
+async_app = CORSMiddleware(
+    Starlette(routes=routes),
+    allow_origin_regex='.*',
+    allow_credentials=True,
+    allow_methods=['*'],
+    allow_headers=['*'],
+)
+flask_app = WsgiToAsgi(server.app)
+
+async def instrumented_async_app(scope, receive, send):
+    """Run the async app, recording the same request metrics and logs as Flask."""
+    headers = dict(scope["headers"])
+    request_id = headers.get(b"x-request-id", b"").decode() or None
+    stats = metrics.start_request(request_id)
+    status = 500
+
+    async def send_with_request_id(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", stats["request_id"].encode())]
+        await send(message)
+
+    try:
+        await async_app(scope, receive, send_with_request_id)
+    finally:
+        metrics.finish_request(stats, scope["method"], scope["path"], status)
+
+async def app(scope, receive, send):
+    """Dispatch the async endpoints to Starlette and everything else to Flask."""
+    if scope["type"] != "http":
+        await async_app(scope, receive, send)
+    elif scope["path"] in async_paths:
+        await instrumented_async_app(scope, receive, send)
+    else:
+        await flask_app(scope, receive, send)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    uvicorn.run(app, port=5000)
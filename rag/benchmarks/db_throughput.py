@@ -0,0 +1,132 @@
+"""
+Multi-threaded read/write throughput of DBManager.
+
+Compares the pooled, WAL-mode DBManager with the previous behaviour of opening
+a new connection per call on the default rollback journal. The in-process hot
+cache is disabled for that comparison and measured separately, so "speedup"
+only reflects pooling and WAL.
+
+Run from the rag/ directory:
+    python -m benchmarks.db_throughput --threads 8 --seconds 5
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from db_manager import DBManager
+
+
+class ConnectPerCallDBManager:
+    """The roadmap/quiz access pattern before connection pooling, for comparison."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # Create the schema, then switch the file back to the rollback journal
+        DBManager(db_path).close()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("PRAGMA journal_mode=DELETE")
+
+    def store_quiz(self, fingerprint, node_id, quiz_data):
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT OR REPLACE INTO quizzes (fingerprint, node_id, quiz_data) VALUES (?, ?, ?)",
+                (fingerprint, node_id, json.dumps(quiz_data))
+            )
+            conn.commit()
+
+    def get_quiz(self, fingerprint, node_id):
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT quiz_data FROM quizzes WHERE fingerprint = ? AND node_id = ?",
+                (fingerprint, node_id)
+            )
+            result = cursor.fetchone()
+            if result:
+                return json.loads(result[0])
+            return None
+
+    def close(self):
+        pass
+
+
+def uncached_db_manager(db_path):
+    """A DBManager whose reads always go to SQLite."""
+    db = DBManager(db_path)
+    db._hot_cache.max_bytes = 0
+    return db
+
+
+def sample_quiz(node_id):
+    return {
+        "quiz": [
+            {
+                "question_id": i,
+                "question": f"Question {i} about node {node_id}?",
+                "options": ["A", "B", "C", "D"],
+                "correct_answer": "A",
+                "explanation": "Because the related chunk says so. " * 5,
+                "related_chunks": [f"{node_id}:{i}"],
+            }
+            for i in range(5)
+        ]
+    }
+
+
+def run(db, threads, seconds, write_ratio, nodes):
+    for node_id in range(nodes):
+        db.store_quiz("bench", str(node_id), sample_quiz(node_id))
+
+    counts = [0] * threads
+    stop = time.monotonic() + seconds
+
+    def worker(index):
+        rng = random.Random(index)
+        while time.monotonic() < stop:
+            node_id = str(rng.randrange(nodes))
+            if rng.random() < write_ratio:
+                db.store_quiz("bench", node_id, sample_quiz(node_id))
+            else:
+                db.get_quiz("bench", node_id)
+            counts[index] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    db.close()
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--nodes", type=int, default=200)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, factory in (
+            ("connect_per_call", ConnectPerCallDBManager),
+            ("pooled_wal", uncached_db_manager),
+            ("pooled_wal_hot_cache", DBManager),
+        ):
+            db = factory(os.path.join(tmp, f"{name}.db"))
+            results[name] = run(db, args.threads, args.seconds, args.write_ratio, args.nodes)
+
+    results["speedup"] = results["pooled_wal"] / results["connect_per_call"]
+    results["hot_cache_speedup"] = results["pooled_wal_hot_cache"] / results["connect_per_call"]
+    print(json.dumps({key: round(value, 2) for key, value in results.items()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
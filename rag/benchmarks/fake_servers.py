@@ -0,0 +1,228 @@
+"""
+Local stand-ins for the Ollama and OpenAI-compatible (DeepSeek) APIs.
+
+Responses are deterministic functions of the request, so repeated runs do
+the same work, and every call waits a configurable latency before answering
+so benchmarks exercise realistic concurrency. Prompts that carry a
+PydanticOutputParser schema get JSON matching that schema (summaries,
+roadmaps, quizzes), referencing the chunk IDs found in the prompt; other
+prompts get a short plain-text answer.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+schema_pattern = re.compile(r"Here is the output schema:\s*```\s*(\{.*?\})\s*```", re.DOTALL)
+chunk_id_pattern = re.compile(r"\b\d+:\d+\b")
+
+
+def _rng(text):
+    return random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+
+def fake_embedding(text, dim):
+    """Unit-length pseudo-random vector determined by the text."""
+    rng = _rng(text)
+    vector = [rng.gauss(0, 1) for _ in range(dim)]
+    norm = sum(value * value for value in vector) ** 0.5
+    return [value / norm for value in vector]
+
+def _output_properties(prompt):
+    match = schema_pattern.search(prompt)
+    if not match:
+        return set()
+    try:
+        return set(json.loads(match.group(1)).get("properties", {}))
+    except json.JSONDecodeError:
+        return set()
+
+def fake_completion(prompt):
+    """Return a deterministic completion that the app's parsers accept."""
+    rng = _rng(prompt)
+    properties = _output_properties(prompt)
+    chunk_ids = list(dict.fromkeys(chunk_id_pattern.findall(prompt))) or ["0:0"]
+
+    if "roadmap" in properties:
+        node_count = max(1, min(6, len(chunk_ids) // 3))
+        per_node = max(1, len(chunk_ids) // node_count)
+        return json.dumps({"roadmap": [
+            {
+                "node_id": node_id,
+                "topic": f"Topic {node_id}",
+                "related_chunks": chunk_ids[(node_id - 1) * per_node:node_id * per_node] or chunk_ids[:1],
+                "summary": "An overview of the material covered in these chunks.",
+                "difficulty": rng.choice(["Beginner", "Intermediate", "Advanced"]),
+                "estimated_time": f"{rng.randint(1, 4)} hours",
+            }
+            for node_id in range(1, node_count + 1)
+        ]})
+    if "quiz" in properties:
+        return json.dumps({"quiz": [
+            {
+                "question_id": question_id,
+                "question": f"Which statement about chunk {chunk_id} is correct?",
+                "options": ["A", "B", "C", "D"],
+                "correct_answer": rng.choice(["A", "B", "C", "D"]),
+                "explanation": "The chunk states it directly.",
+                "related_chunks": [chunk_id],
+            }
+            for question_id, chunk_id in enumerate(chunk_ids[:5], start=1)
+        ]})
+    if "keywords" in properties:
+        words = re.findall(r"[a-z]{5,}", prompt.lower()[-2000:])
+        keywords = [word for word, _ in Counter(words).most_common(5)] or ["document"]
+        return json.dumps({
+            "topic": keywords[0].title(),
+            "keywords": ", ".join(keywords),
+            "summary": "This chunk discusses " + ", ".join(keywords) + ".",
+        })
+    return "<think>Looking at the context.</think>" + " ".join(
+        rng.choice(["The", "context", "explains", "that", "this", "section", "covers", "the", "topic"])
+        for _ in range(40)
+    ) + "."
+
+def _tokens(text):
+    return re.findall(r"\S+\s*", text)
+
+
+class FakeModelHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    # Response helpers
+
+    def _send_json(self, body):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data):
+        data = data.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    # Routing
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server = self.server
+        with server.lock:
+            server.requests[self.path] += 1
+
+        if self.path == "/api/embed":
+            time.sleep(server.embed_latency)
+            texts = request["input"] if isinstance(request["input"], list) else [request["input"]]
+            self._send_json({"model": request["model"], "embeddings": [fake_embedding(text, server.embedding_dim) for text in texts]})
+        elif self.path == "/api/embeddings":
+            time.sleep(server.embed_latency)
+            self._send_json({"embedding": fake_embedding(request["prompt"], server.embedding_dim)})
+        elif self.path == "/api/chat":
+            self._ollama_chat(request)
+        elif self.path.endswith("/chat/completions"):
+            self._openai_chat(request)
+        else:
+            self.send_error(404)
+
+    def _prompt(self, request):
+        return "\n".join(str(message.get("content", "")) for message in request.get("messages", []))
+
+    def _ollama_chat(self, request):
+        content = fake_completion(self._prompt(request))
+        time.sleep(self.server.latency)
+        base = {"model": request["model"], "created_at": "2024-01-01T00:00:00Z"}
+        final = {
+            **base,
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+            "done_reason": "stop",
+            "prompt_eval_count": len(self._prompt(request)) // 4,
+            "eval_count": len(_tokens(content)),
+        }
+        if not request.get("stream", True):
+            final["message"]["content"] = content
+            self._send_json(final)
+            return
+        self._start_chunked("application/x-ndjson")
+        for token in _tokens(content):
+            time.sleep(self.server.token_latency)
+            self._write_chunk(json.dumps({**base, "message": {"role": "assistant", "content": token}, "done": False}) + "\n")
+        self._write_chunk(json.dumps(final) + "\n")
+        self._end_chunked()
+
+    def _openai_chat(self, request):
+        prompt = self._prompt(request)
+        content = fake_completion(prompt)
+        time.sleep(self.server.latency)
+        base = {"id": "chatcmpl-fake", "created": 0, "model": request.get("model") or "fake"}
+        usage = {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(_tokens(content)),
+            "total_tokens": len(prompt) // 4 + len(_tokens(content)),
+        }
+        if not request.get("stream"):
+            self._send_json({
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+        self._start_chunked("text/event-stream")
+        for token in _tokens(content):
+            time.sleep(self.server.token_latency)
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+        chunk = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+        self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self._end_chunked()
+
+
+class FakeModelServer(ThreadingHTTPServer):
+    """
+    Serves the fake Ollama and OpenAI-compatible APIs on a local port.
+
+    Args:
+        latency (float): Seconds before a chat response starts.
+        token_latency (float): Seconds between streamed tokens.
+        embed_latency (float): Seconds per embedding request.
+        embedding_dim (int): Length of returned embeddings.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.05, token_latency=0.0, embed_latency=0.01, embedding_dim=256, port=0):
+        super().__init__(("127.0.0.1", port), FakeModelHandler)
+        self.latency = latency
+        self.token_latency = token_latency
+        self.embed_latency = embed_latency
+        self.embedding_dim = embedding_dim
+        self.requests = Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
@@ -0,0 +1,226 @@
+"""
+End-to-end benchmark that runs without Ollama or DeepSeek.
+
+Starts local fake Ollama and OpenAI-compatible servers (see fake_servers),
+points the app at them and, for synthetic PDFs of each requested size,
+measures ingest_file, create_roadmap, create_quiz and chat_with_chunk, then
+the same flow through the Flask endpoints. All state is kept in a temporary
+working directory, so caches start cold. Each scenario runs in a fresh
+process, so its peak RSS is its own rather than the largest seen so far.
+Prints (or writes) JSON with throughput, p50/p99 latency and peak RSS per
+scenario, for tracking regressions over time.
+
+Run from the rag/ directory:
+    python -m benchmarks.offline --pages 5 20 50 --latency 0.05 --output offline.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from benchmarks.fake_servers import FakeModelServer
+from benchmarks.synthetic_pdf import write_pdf
+
+rag_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_rss_mb():
+    # ru_maxrss is the peak of this process, in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def percentile(values, q):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+def run_concurrently(func, items, concurrency):
+    """Call func on every item with `concurrency` threads; return (latencies, results, wall seconds)."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(lambda item: timed(func, item), items))
+    wall = time.perf_counter() - start
+    return [latency for latency, _ in outcomes], [result for _, result in outcomes], wall
+
+def report(latencies, wall, units=None):
+    """Summarize latencies; throughput counts `units` (default: calls) per second."""
+    units = len(latencies) if units is None else units
+    return {
+        "count": len(latencies),
+        "throughput_per_s": round(units / wall, 3) if wall else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def configure(ollama_url, openai_url, workdir):
+    """Point the app at the fake servers and the shared working directory."""
+    os.environ.update({
+        "OLLAMA_BASE_URL": ollama_url,
+        "OLLAMA_EMBEDDING_MODEL": "fake-embed",
+        "OLLAMA_CHAT_MODEL": "fake-chat",
+        "OLLAMA_SUMMARY_MODEL": "fake-summary",
+        "DEEPSEEK_BASE_URL": f"{openai_url}/v1",
+        "DEEPSEEK_API_KEY": "fake",
+        "DEEPSEEK_MODEL": "fake-deepseek",
+    })
+    # The app uses paths relative to the working directory for all its state
+    os.chdir(workdir)
+    os.makedirs("db", exist_ok=True)
+    os.makedirs("uploads", exist_ok=True)
+    if rag_directory not in sys.path:
+        sys.path.insert(0, rag_directory)
+
+
+def bench_modules(pages, args):
+    """Drive the pipeline functions directly."""
+    from ingest import ingest_file, initialize_vector_store
+    from roadmap import create_roadmap
+    from quiz import create_quiz
+    from chat_with_chunk import chat_with_chunk
+
+    collection_name = f"bench-{pages}"
+    path = write_pdf(os.path.join("uploads", f"modules-{pages}.pdf"), pages, seed=pages)
+    results = {}
+
+    vector_store = initialize_vector_store(collection_name=collection_name)
+    latency, changes = timed(ingest_file, path, vector_store=vector_store)
+    results["ingest_file"] = report([latency], latency, units=len(changes["added"]))
+    results["ingest_file"]["chunks"] = len(changes["added"])
+
+    latency, roadmap = timed(create_roadmap, collection_name)
+    results["create_roadmap"] = report([latency], latency)
+    nodes = roadmap["roadmap"] if roadmap else []
+    if not nodes:
+        results["create_roadmap"]["error"] = "no roadmap"
+        return results
+
+    latencies, _, wall = run_concurrently(lambda node: create_quiz(node, collection_name), nodes, args.concurrency)
+    results["create_quiz"] = report(latencies, wall)
+
+    questions = [(f"Question {i} about this topic?", nodes[i % len(nodes)]) for i in range(args.requests)]
+    latencies, _, wall = run_concurrently(
+        lambda item: chat_with_chunk(item[0], item[1], collection_name), questions, args.concurrency
+    )
+    results["chat_with_chunk"] = report(latencies, wall)
+    return results
+
+
+def bench_endpoints(pages, args):
+    """Drive the same flow through the Flask endpoints."""
+    import server
+
+    filename = f"endpoints-{pages}.pdf"
+    path = write_pdf(os.path.join(tempfile.gettempdir(), filename), pages, seed=10_000 + pages)
+    headers = {"Cookie": f"current_file={filename}"}
+    results = {}
+
+    def request(method, url, **kwargs):
+        response = getattr(server.app.test_client(), method)(url, headers=headers, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method.upper()} {url} returned {response.status_code}: {response.get_data(as_text=True)}")
+        return response.get_json()
+
+    # Upload, then poll the ingestion job until it finishes
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        job = request("post", "/ingest", data={"file": (f, filename)}, content_type="multipart/form-data")
+    while job.get("status") not in ("completed", "failed", None):
+        time.sleep(0.05)
+        job = request("get", f"/ingest/{job['job_id']}")
+    latency = time.perf_counter() - start
+    results["ingest"] = report([latency], latency, units=job.get("progress", {}).get("chunks_embedded") or 0)
+    results["ingest"]["status"] = job.get("status")
+
+    latency, roadmap = timed(request, "get", "/roadmap")
+    results["roadmap_cold"] = report([latency], latency)
+    latencies, _, wall = run_concurrently(lambda _: request("get", "/roadmap"), range(args.requests), args.concurrency)
+    results["roadmap_cached"] = report(latencies, wall)
+
+    nodes = roadmap["roadmap"]
+    latencies, _, wall = run_concurrently(
+        lambda node: request("post", "/quiz", json={"node_data": node}), nodes, args.concurrency
+    )
+    results["quiz"] = report(latencies, wall)
+
+    questions = [(f"Endpoint question {i}?", nodes[i % len(nodes)]) for i in range(args.requests)]
+    latencies, _, wall = run_concurrently(
+        lambda item: request("post", "/chat-with-chunk", json={"query": item[0], "node_data": item[1]}),
+        questions, args.concurrency
+    )
+    results["chat_with_chunk"] = report(latencies, wall)
+
+    latencies, _, wall = run_concurrently(
+        lambda item: request("post", "/chat", json={"query": item[0]}), questions, args.concurrency
+    )
+    results["chat"] = report(latencies, wall)
+    return results
+
+
+def run_scenario(kind, pages, args, ollama_url, openai_url, workdir):
+    """Run one scenario in the current (fresh) process and add its peak RSS."""
+    configure(ollama_url, openai_url, workdir)
+    bench = bench_modules if kind == "modules" else bench_endpoints
+    results = bench(pages, args)
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[5, 20, 50])
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds before each chat response")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds between streamed tokens")
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="Seconds per embedding request")
+    parser.add_argument("--embedding-dim", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=20, help="Chat requests per scenario")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    server_options = {
+        "latency": args.latency,
+        "token_latency": args.token_latency,
+        "embed_latency": args.embed_latency,
+        "embedding_dim": args.embedding_dim,
+    }
+    ollama = FakeModelServer(**server_options).start()
+    openai = FakeModelServer(**server_options).start()
+    workdir = tempfile.mkdtemp(prefix="rag-bench-")
+
+    results = {}
+    spawn = multiprocessing.get_context("spawn")
+    for pages in args.pages:
+        results[f"pages_{pages}"] = {}
+        for kind in ("modules", "endpoints"):
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                results[f"pages_{pages}"][kind] = pool.submit(
+                    run_scenario, kind, pages, args, ollama.url, openai.url, workdir
+                ).result()
+
+    report_json = {
+        "config": {**vars(args), "workdir": workdir},
+        "results": results,
+        "server_requests": {"ollama": dict(ollama.requests), "openai": dict(openai.requests)},
+    }
+    text = json.dumps(report_json, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Stored size and read latency of roadmap/quiz payloads per encoding.
+
+Stores the same roadmap and quizzes with each DB_PAYLOAD_COMPRESSION setting
+and reports the database size and the mean time to read back a quiz with the
+hot cache disabled (decode included).
+
+Run from the rag/ directory:
+    python -m benchmarks.payload_compression --nodes 200 --reads 5000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import db_manager
+from benchmarks.db_throughput import sample_quiz
+from db_manager import DBManager
+
+
+def sample_roadmap(nodes):
+    return {
+        "roadmap": [
+            {
+                "node_id": node_id,
+                "title": f"Topic {node_id}",
+                "description": "An overview of the concepts covered in this part of the document. " * 3,
+                "related_chunks": [f"{node_id}:{i}" for i in range(8)],
+            }
+            for node_id in range(1, nodes + 1)
+        ]
+    }
+
+
+def run(path, compression, nodes, reads):
+    db_manager.payload_compression = compression
+    db = DBManager(path)
+    db._hot_cache.max_bytes = 0
+    db.store_roadmap("bench", sample_roadmap(nodes))
+    db.store_quizzes("bench", {str(node_id): sample_quiz(node_id) for node_id in range(nodes)})
+
+    with db._connect() as conn:
+        payload_bytes = conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(quiz_data)), 0) FROM quizzes"
+        ).fetchone()[0] + conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(roadmap_data)), 0) FROM roadmaps"
+        ).fetchone()[0]
+        conn.execute("VACUUM")
+
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for _ in range(reads):
+        db.get_quiz_json("bench", str(rng.randrange(nodes)))
+    read_us = (time.perf_counter() - start) / reads * 1e6
+    db.close()
+
+    return {
+        "payload_bytes": payload_bytes,
+        "file_bytes": os.path.getsize(path),
+        "read_us": round(read_us, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=200)
+    parser.add_argument("--reads", type=int, default=5000)
+    args = parser.parse_args()
+
+    encodings = ["none", "zlib"]
+    if db_manager.zstandard is not None:
+        encodings.append("zstd")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for compression in encodings:
+            path = os.path.join(tmp, f"{compression}.db")
+            results[compression] = run(path, compression, args.nodes, args.reads)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Deterministic synthetic PDFs for benchmarks, written without extra dependencies.
+"""
+import random
+
+vocabulary = (
+    "attention transformer encoder decoder layer network gradient training "
+    "contract liability statute clause tenant employer section provision "
+    "protein enzyme membrane cell reaction molecule energy pathway "
+    "algorithm complexity memory cache latency throughput index query"
+).split()
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def page_lines(rng, page_number, lines=45, words_per_line=12):
+    text = [f"Section {page_number}.{rng.randint(1, 9)} {rng.choice(vocabulary).title()}"]
+    for _ in range(lines - 1):
+        text.append(" ".join(rng.choice(vocabulary) for _ in range(words_per_line)) + ".")
+    return text
+
+def write_pdf(path, pages, seed=0):
+    """
+    Write a PDF of `pages` pages of pseudo-random text to `path`.
+
+    The same pages and seed always produce the same file.
+    """
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for page_number in range(1, pages + 1):
+        lines = page_lines(rng, page_number)
+        stream = "BT /F1 10 Tf 12 TL 50 770 Td " + " ".join(f"({_escape(line)}) '" for line in lines) + " ET"
+        stream = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = " ".join(f"{ref} 0 R" for ref in page_refs)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_refs)} >>".encode()
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    with open(path, "wb") as f:
+        f.write(output)
+    return path
@@ -0,0 +1,117 @@
+"""
+Recall and latency of the NumPy vector store against Chroma.
+
+Indexes synthetic embeddings in each backend, then runs queries near random
+documents and reports build time, query latency percentiles and recall@k
+against an exact float32 search. Embeddings are precomputed, so no
+embedding model is needed. Chroma is skipped if it is not installed.
+
+Run from the rag/ directory:
+    python -m benchmarks.vector_backends --docs 5000 --dim 768 --queries 200
+"""
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from numpy_store import NumpyVectorStore
+
+
+class LookupEmbeddings(Embeddings):
+    """Returns precomputed vectors for known texts."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)) * 1000, 3)
+
+
+def run(store, documents, queries, exact, k, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(documents), batch_size):
+        batch = documents[i:i + batch_size]
+        store.add_documents(batch, ids=[document.metadata['chunk_id'] for document in batch])
+    build_seconds = time.perf_counter() - start
+
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, exact):
+        start = time.perf_counter()
+        results = store.similarity_search_with_score(query, k=k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(expected & {document.metadata['chunk_id'] for document, _ in results})
+
+    return {
+        "build_s": round(build_seconds, 3),
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "recall_at_k": round(hits / (len(queries) * k), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    doc_vectors = rng.standard_normal((args.docs, args.dim)).astype(np.float32)
+    # Queries are noisy copies of random documents, so each has close neighbours
+    targets = rng.integers(0, args.docs, args.queries)
+    query_vectors = doc_vectors[targets] + rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    vectors = {f"doc {i}": vector.tolist() for i, vector in enumerate(doc_vectors)}
+    queries = [f"query {i}" for i in range(args.queries)]
+    vectors.update({query: vector.tolist() for query, vector in zip(queries, query_vectors)})
+    embeddings = LookupEmbeddings(vectors)
+    documents = [
+        Document(page_content=f"doc {i}", metadata={"chunk_id": f"0:{i}", "page": 0})
+        for i in range(args.docs)
+    ]
+
+    normalized = doc_vectors / np.linalg.norm(doc_vectors, axis=1, keepdims=True)
+    exact_scores = (query_vectors / np.linalg.norm(query_vectors, axis=1, keepdims=True)) @ normalized.T
+    exact = [
+        {f"0:{i}" for i in np.argsort(-scores)[:args.k]}
+        for scores in exact_scores
+    ]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in ("float16", "int8"):
+            store = NumpyVectorStore(f"bench-{dtype}", embeddings, persist_directory=tmp, dtype=dtype)
+            results[f"numpy_{dtype}"] = run(store, documents, queries, exact, args.k, args.batch_size)
+
+        try:
+            from langchain_chroma import Chroma
+        except ImportError:
+            results["chroma"] = "skipped: langchain_chroma is not installed"
+        else:
+            store = Chroma(
+                collection_name="bench",
+                embedding_function=embeddings,
+                persist_directory=tmp,
+                collection_metadata={"hnsw:space": "cosine"},
+            )
+            results["chroma"] = run(store, documents, queries, exact, args.k, args.batch_size)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
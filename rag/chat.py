@@ -1,39 +1,128 @@
 from langchain_chroma import Chroma
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains import create_retrieval_chain
-from models import Models
+from models import get_models
 from prompts import CHAT_TEMPLATE
+from answer_cache import answer_cache
 from ingest import initialize_vector_store
-import re
+from retrieval import HybridRetriever, retrieval_mode
+from streaming import afilter_think_stream, filter_think_stream, filter_think_tags
+import asyncio
 
-def filter_think_tags(response_content):
-    """
-    Filters out <think> tags and their content from the response text.
-    
-    Args:
-        response_content (str): Text containing potential <think> tags
-        
-    Returns:
-        str: Text with <think> tags and their content removed
-    """
-    pattern = r'<think>.*?</think>*'
-    filtered_content = re.sub(pattern, '', response_content, flags=re.DOTALL)
-    return filtered_content.strip()
-
-
-def chat_with_docs(query: str, collection_name: str = "documents") -> str:
-    models = Models()
-    embeddings = models.embeddings_model
-    llm = models.chunk_model
+def build_chat_chain(collection_name: str = "documents", mode: str = None):
+    llm = get_models().chunk_model
 
     vector_store = initialize_vector_store(collection_name=collection_name)
-    retriever = vector_store.as_retriever(kwargs={"k":3})
+    # Retrieval is "hybrid" (BM25 fused with vectors), "vector" or "lexical"
+    retriever = HybridRetriever(
+        vector_store=vector_store,
+        collection_name=collection_name,
+        mode=mode or retrieval_mode,
+    )
     combined_docs_chain = create_stuff_documents_chain(llm, CHAT_TEMPLATE)
-    retriever_chain = create_retrieval_chain(retriever, combined_docs_chain)
+    return create_retrieval_chain(retriever, combined_docs_chain)
+
+
+def uses_answer_cache(mode: str = None) -> bool:
+    # Lexical mode promises no embedding call, so it bypasses the answer cache
+    return (mode or retrieval_mode) != "lexical"
+
+
+def chat_with_docs(query: str, collection_name: str = "documents", mode: str = None) -> str:
+    # Reuse the answer to a near-identical question about the same collection and mode
+    mode = mode or retrieval_mode
+    if uses_answer_cache(mode):
+        # Read before answering, so an ingest that finishes meanwhile keeps the answer out of the cache
+        generation = answer_cache.generation(collection_name)
+        query_embedding = get_models().embeddings_model.embed_query(query)
+        cached_answer = answer_cache.get(collection_name, query_embedding, mode)
+        if cached_answer is not None:
+            return cached_answer
+
+    retriever_chain = build_chat_chain(collection_name, mode)
 
     response = retriever_chain.invoke({"input": query})
     filtered_response = filter_think_tags(response["answer"])
-    return response["answer"] if response else ""
+    answer = response["answer"] if response else ""
+    if answer and uses_answer_cache(mode):
+        answer_cache.put(collection_name, query, query_embedding, answer, mode, generation)
+    return answer
+
+
+def stream_chat_with_docs(query: str, collection_name: str = "documents", mode: str = None):
+    """
+    Stream the answer to a question over a collection, token by token.
+
+    Yields:
+        str: Pieces of the answer with <think> spans removed.
+    """
+    mode = mode or retrieval_mode
+    if uses_answer_cache(mode):
+        generation = answer_cache.generation(collection_name)
+        query_embedding = get_models().embeddings_model.embed_query(query)
+        cached_answer = answer_cache.get(collection_name, query_embedding, mode)
+        if cached_answer is not None:
+            yield from filter_think_stream([cached_answer])
+            return
+
+    retriever_chain = build_chat_chain(collection_name, mode)
+    answer = []
+
+    def answer_tokens():
+        for chunk in retriever_chain.stream({"input": query}):
+            if "answer" in chunk:
+                answer.append(chunk["answer"])
+                yield chunk["answer"]
+
+    yield from filter_think_stream(answer_tokens())
+    if answer and uses_answer_cache(mode):
+        answer_cache.put(collection_name, query, query_embedding, "".join(answer), mode, generation)
+
+
+async def achat_with_docs(query: str, collection_name: str = "documents", mode: str = None) -> str:
+    """Async version of chat_with_docs; retrieval runs in a worker thread."""
+    mode = mode or retrieval_mode
+    if uses_answer_cache(mode):
+        generation = await asyncio.to_thread(answer_cache.generation, collection_name)
+        query_embedding = await get_models().embeddings_model.aembed_query(query)
+        cached_answer = await asyncio.to_thread(answer_cache.get, collection_name, query_embedding, mode)
+        if cached_answer is not None:
+            return cached_answer
+
+    retriever_chain = await asyncio.to_thread(build_chat_chain, collection_name, mode)
+
+    response = await retriever_chain.ainvoke({"input": query})
+    answer = response["answer"] if response else ""
+    if answer and uses_answer_cache(mode):
+        await asyncio.to_thread(answer_cache.put, collection_name, query, query_embedding, answer, mode, generation)
+    return answer
+
+
+async def astream_chat_with_docs(query: str, collection_name: str = "documents", mode: str = None):
+    """Async version of stream_chat_with_docs."""
+    mode = mode or retrieval_mode
+    if uses_answer_cache(mode):
+        generation = await asyncio.to_thread(answer_cache.generation, collection_name)
+        query_embedding = await get_models().embeddings_model.aembed_query(query)
+        cached_answer = await asyncio.to_thread(answer_cache.get, collection_name, query_embedding, mode)
+        if cached_answer is not None:
+            for token in filter_think_stream([cached_answer]):
+                yield token
+            return
+
+    retriever_chain = await asyncio.to_thread(build_chat_chain, collection_name, mode)
+    answer = []
+
+    async def answer_tokens():
+        async for chunk in retriever_chain.astream({"input": query}):
+            if "answer" in chunk:
+                answer.append(chunk["answer"])
+                yield chunk["answer"]
+
+    async for token in afilter_think_stream(answer_tokens()):
+        yield token
+    if answer and uses_answer_cache(mode):
+        await asyncio.to_thread(answer_cache.put, collection_name, query, query_embedding, "".join(answer), mode, generation)
 
 if __name__ == "__main__":
     response = chat_with_docs("When attention should not be used?")
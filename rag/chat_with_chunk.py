@@ -1,16 +1,21 @@
-from models import Models
-from ingest import return_chunk_by_id, initialize_vector_store
+from models import get_models
+from ingest import return_chunks_by_ids, initialize_vector_store
 from prompts import CHUNK_TEMPLATE
-import re
+from streaming import afilter_think_stream, filter_think_stream, filter_think_tags
+from llm_cache import cached_llm
+import asyncio
 
-model = Models()
+model = get_models()
 chunk_model = model.chunk_model
-chain = CHUNK_TEMPLATE | chunk_model
+chain = CHUNK_TEMPLATE | cached_llm(chunk_model, "chunk")
+# Streaming bypasses the response cache so tokens arrive as they are generated
+stream_chain = CHUNK_TEMPLATE | chunk_model
 
 def format_related_chunks(node, vector_store):
     formatted_text = ""
+    chunks = return_chunks_by_ids(node["related_chunks"], vector_store)
     for chunk_id in node["related_chunks"]:
-        chunk = return_chunk_by_id(vector_store=vector_store, chunk_id=chunk_id)
+        chunk = chunks.get(chunk_id)
         if chunk:
             formatted_text += f"Chunk ID: {chunk_id}\n"
             formatted_text += f"Content: {chunk['content']}\n"
@@ -18,20 +23,6 @@ def format_related_chunks(node, vector_store):
     return formatted_text
 
 
-def filter_think_tags(response_content):
-    """
-    Filters out <think> tags and their content from the response text.
-    
-    Args:
-        response_content (str): Text containing potential <think> tags
-        
-    Returns:
-        str: Text with <think> tags and their content removed
-    """
-    pattern = r'<think>.*?</think>\s*'
-    filtered_content = re.sub(pattern, '', response_content, flags=re.DOTALL)
-    return filtered_content.strip()
-
 def chat_with_chunk(text, node, filename):
     vector_store = initialize_vector_store(filename)
     context = format_related_chunks(node, vector_store)
@@ -41,6 +32,37 @@ def chat_with_chunk(text, node, filename):
     filtered_response = filter_think_tags(response.content)
     return filtered_response
 
+def stream_chat_with_chunk(text, node, filename):
+    """
+    Stream the answer to a question about a roadmap node, token by token.
+
+    Yields:
+        str: Pieces of the answer with <think> spans removed.
+    """
+    vector_store = initialize_vector_store(filename)
+    context = format_related_chunks(node, vector_store)
+    tokens = (chunk.content for chunk in stream_chain.stream({"user_query": text, "context": context}))
+    yield from filter_think_stream(tokens)
+
+async def achat_with_chunk(text, node, filename):
+    """Async version of chat_with_chunk; vector store reads run in a worker thread."""
+    vector_store = await asyncio.to_thread(initialize_vector_store, filename)
+    context = await asyncio.to_thread(format_related_chunks, node, vector_store)
+    response = await chain.ainvoke({"user_query": text, "context": context})
+    return filter_think_tags(response.content)
+
+async def astream_chat_with_chunk(text, node, filename):
+    """Async version of stream_chat_with_chunk."""
+    vector_store = await asyncio.to_thread(initialize_vector_store, filename)
+    context = await asyncio.to_thread(format_related_chunks, node, vector_store)
+
+    async def tokens():
+        async for chunk in stream_chain.astream({"user_query": text, "context": context}):
+            yield chunk.content
+
+    async for token in afilter_think_stream(tokens()):
+        yield token
+
 if __name__ == "__main__":
     node = {
         "node_id": 1,
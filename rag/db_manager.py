@@ -1,75 +1,715 @@
+import os
 import sqlite3
 import json
+import threading
+import time
+import uuid
+import weakref
+import zlib
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+load_dotenv()
+
+# SQLite tuning
+db_cache_size_kb = int(os.environ.get("DB_CACHE_SIZE_KB", 16384))
+db_busy_timeout_ms = int(os.environ.get("DB_BUSY_TIMEOUT_MS", 5000))
+# In-process cache of decoded roadmaps and quizzes
+hot_cache_max_bytes = int(os.environ.get("DB_HOT_CACHE_BYTES", 64 * 1024 * 1024))
+hot_cache_ttl = float(os.environ.get("DB_HOT_CACHE_TTL_SECONDS", 300))
+
+# Encoding of stored roadmap/quiz payloads: "none" (JSON text), "zlib" or "zstd"
+payload_compression = os.environ.get("DB_PAYLOAD_COMPRESSION", "none")
+
+# Compressed payloads are BLOBs whose first byte is the format version
+PAYLOAD_ZLIB = 1
+PAYLOAD_ZSTD = 2
+
+def encode_payload(json_text, compression=None):
+    """
+    Encode a JSON payload for storage.
+
+    Returns the JSON text unchanged when compression is "none", otherwise a
+    BLOB made of a format version byte followed by the compressed JSON. If
+    zstd is requested but the zstandard package is not installed, zlib is used.
+    """
+    compression = compression or payload_compression
+    if compression not in ("none", "zlib", "zstd"):
+        raise ValueError(f"Unsupported payload compression: {compression}")
+    if compression == "none":
+        return json_text
+    data = json_text.encode()
+    if compression == "zstd" and zstandard is not None:
+        return bytes([PAYLOAD_ZSTD]) + zstandard.ZstdCompressor().compress(data)
+    return bytes([PAYLOAD_ZLIB]) + zlib.compress(data)
+
+def decode_payload(value):
+    """Decode a stored payload to JSON text, accepting plain TEXT rows too."""
+    if isinstance(value, str):
+        return value
+    version, data = value[0], value[1:]
+    if version == PAYLOAD_ZLIB:
+        return zlib.decompress(data).decode()
+    if version == PAYLOAD_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed payloads")
+        return zstandard.ZstdDecompressor().decompress(data).decode()
+    raise ValueError(f"Unknown payload format version: {version}")
+
+class _ThreadConnection:
+    """Holds one thread's connection and closes it when the thread exits."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __del__(self):
+        self.conn.close()
+
+class _HotCache:
+    """
+    Thread-safe LRU of decoded payloads and their JSON bytes, bounded by the
+    total size of the JSON. Entries expire after `ttl` seconds so writes made
+    by other processes are picked up.
+    """
+
+    def __init__(self, max_bytes=hot_cache_max_bytes, ttl=hot_cache_ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key, value, json_bytes):
+        with self._lock:
+            self._remove(key)
+            if len(json_bytes) > self.max_bytes:
+                return
+            self._entries[key] = (value, json_bytes, time.monotonic() + self.ttl)
+            self._size += len(json_bytes)
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def evict_document(self, fingerprint):
+        """Drop the roadmap and all quizzes cached for a document."""
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == fingerprint]:
+                self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
 
 class DBManager:
     def __init__(self, db_path='./db/roadmaps.db'):
         self.db_path = db_path
+        self._hot_cache = _HotCache()
+        self._local = threading.local()
+        self._connections = weakref.WeakSet()
+        self._connections_lock = threading.Lock()
         self._init_db()
 
+    def _connect(self):
+        """
+        Return this thread's connection, opening it on first use.
+
+        Connections are kept open per thread and use WAL journaling, so
+        readers don't block the writer and commits only sync at checkpoints.
+        """
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            # Each connection is only used by its own thread, but may be closed
+            # from another one by close() or when the thread exits
+            conn = sqlite3.connect(self.db_path, timeout=db_busy_timeout_ms / 1000, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA cache_size=-{db_cache_size_kb}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            holder = _ThreadConnection(conn)
+            self._local.holder = holder
+            with self._connections_lock:
+                self._connections.add(holder)
+        return holder.conn
+
+    def close(self):
+        """Close every pooled connection."""
+        with self._connections_lock:
+            for holder in list(self._connections):
+                holder.conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
     def _init_db(self):
         """Initialize the database with required tables."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
+            # Roadmaps and quizzes used to be keyed by filename; rename the column
+            # so old databases open. Their rows are re-keyed as files are registered.
+            for table in ("roadmaps", "quizzes"):
+                cursor.execute(f"PRAGMA table_info({table})")
+                if "filename" in [row[1] for row in cursor.fetchall()]:
+                    cursor.execute(f"ALTER TABLE {table} RENAME COLUMN filename TO fingerprint")
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS roadmaps (
-                    filename TEXT PRIMARY KEY,
+                    fingerprint TEXT PRIMARY KEY,
                     roadmap_data TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS quizzes (
-                    filename TEXT,
+                    fingerprint TEXT,
                     node_id TEXT,
                     quiz_data TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (filename, node_id)
+                    PRIMARY KEY (fingerprint, node_id)
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    fingerprint TEXT PRIMARY KEY,
+                    collection_name TEXT,
+                    ref_count INTEGER DEFAULT 0,
+                    ingest_pending INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # Content registered before ingest_pending existed was already queued
+            cursor.execute("PRAGMA table_info(fingerprints)")
+            if "ingest_pending" not in [row[1] for row in cursor.fetchall()]:
+                cursor.execute("ALTER TABLE fingerprints ADD COLUMN ingest_pending INTEGER DEFAULT 0")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS uploads (
+                    filename TEXT PRIMARY KEY,
+                    fingerprint TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    filename TEXT,
+                    file_path TEXT,
+                    collection_name TEXT,
+                    status TEXT,
+                    pages_parsed INTEGER DEFAULT 0,
+                    chunks_total INTEGER DEFAULT 0,
+                    chunks_summarized INTEGER DEFAULT 0,
+                    chunks_embedded INTEGER DEFAULT 0,
+                    error TEXT,
+                    owner TEXT,
+                    lease_expires REAL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # Jobs recorded before leases existed have no owner and can be claimed
+            cursor.execute("PRAGMA table_info(ingest_jobs)")
+            job_columns = [row[1] for row in cursor.fetchall()]
+            for column, column_type in (("owner", "TEXT"), ("lease_expires", "REAL")):
+                if column not in job_columns:
+                    cursor.execute(f"ALTER TABLE ingest_jobs ADD COLUMN {column} {column_type}")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    key TEXT PRIMARY KEY,
+                    owner TEXT,
+                    expires_at REAL,
+                    error TEXT
                 )
             """)
             conn.commit()
 
-    def store_roadmap(self, filename, roadmap_data):
+    def store_roadmap(self, fingerprint, roadmap_data):
         """Store a roadmap in the database."""
-        with sqlite3.connect(self.db_path) as conn:
+        roadmap_json = json.dumps(roadmap_data)
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                "INSERT OR REPLACE INTO roadmaps (filename, roadmap_data) VALUES (?, ?)",
-                (filename, json.dumps(roadmap_data))
+                "INSERT OR REPLACE INTO roadmaps (fingerprint, roadmap_data) VALUES (?, ?)",
+                (fingerprint, encode_payload(roadmap_json))
             )
             conn.commit()
+        self._hot_cache.put(("roadmap", fingerprint), roadmap_data, roadmap_json.encode())
+
+    def _get_roadmap_entry(self, fingerprint):
+        key = ("roadmap", fingerprint)
+        entry = self._hot_cache.get(key)
+        if entry is None:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT roadmap_data FROM roadmaps WHERE fingerprint = ?",
+                    (fingerprint,)
+                )
+                result = cursor.fetchone()
+            if result:
+                roadmap_json = decode_payload(result[0])
+                entry = (json.loads(roadmap_json), roadmap_json.encode())
+                self._hot_cache.put(key, *entry)
+        return entry
+
+    def get_roadmap(self, fingerprint):
+        """Retrieve a roadmap from the database. The result is shared; do not modify it."""
+        entry = self._get_roadmap_entry(fingerprint)
+        return entry[0] if entry else None
 
-    def get_roadmap(self, filename):
-        """Retrieve a roadmap from the database."""
-        with sqlite3.connect(self.db_path) as conn:
+    def get_roadmap_json(self, fingerprint):
+        """Retrieve a roadmap as encoded JSON bytes, ready to send as a response."""
+        entry = self._get_roadmap_entry(fingerprint)
+        return entry[1] if entry else None
+            
+    def store_quiz(self, fingerprint, node_id, quiz_data):
+        """Store a quiz in the database."""
+        self.store_quizzes(fingerprint, {node_id: quiz_data})
+
+    def store_quizzes(self, fingerprint, quizzes):
+        """Store several quizzes for a document in one transaction.
+
+        Args:
+            fingerprint (str): The document fingerprint.
+            quizzes (dict): Maps node IDs to quiz data.
+        """
+        rows = [(fingerprint, str(node_id), json.dumps(quiz_data)) for node_id, quiz_data in quizzes.items()]
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "INSERT OR REPLACE INTO quizzes (fingerprint, node_id, quiz_data) VALUES (?, ?, ?)",
+                [(fingerprint, node_id, encode_payload(quiz_json)) for _, node_id, quiz_json in rows]
+            )
+            conn.commit()
+        for (_, node_id, quiz_json), quiz_data in zip(rows, quizzes.values()):
+            self._hot_cache.put(("quiz", fingerprint, node_id), quiz_data, quiz_json.encode())
+
+    def _get_quiz_entry(self, fingerprint, node_id):
+        key = ("quiz", fingerprint, str(node_id))
+        entry = self._hot_cache.get(key)
+        if entry is None:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT quiz_data FROM quizzes WHERE fingerprint = ? AND node_id = ?",
+                    (fingerprint, str(node_id))
+                )
+                result = cursor.fetchone()
+            if result:
+                quiz_json = decode_payload(result[0])
+                entry = (json.loads(quiz_json), quiz_json.encode())
+                self._hot_cache.put(key, *entry)
+        return entry
+
+    def get_quiz(self, fingerprint, node_id):
+        """Retrieve a quiz from the database. The result is shared; do not modify it."""
+        entry = self._get_quiz_entry(fingerprint, node_id)
+        return entry[0] if entry else None
+
+    def get_quiz_json(self, fingerprint, node_id):
+        """Retrieve a quiz as encoded JSON bytes, ready to send as a response."""
+        entry = self._get_quiz_entry(fingerprint, node_id)
+        return entry[1] if entry else None
+
+    def compress_existing_payloads(self, batch_size=500):
+        """
+        Re-encode stored roadmaps and quizzes with the configured compression.
+
+        Rows are converted in batches, so this can run while the server is
+        serving; rows not yet converted are still read as before.
+
+        Returns:
+            int: The number of rows re-encoded.
+        """
+        converted = 0
+        for table, column in (("roadmaps", "roadmap_data"), ("quizzes", "quiz_data")):
+            last_rowid = 0
+            while True:
+                with self._connect() as conn:
+                    cursor = conn.cursor()
+                    # Each batch is one write transaction, so a payload stored
+                    # concurrently is never overwritten with its old value
+                    cursor.execute("BEGIN IMMEDIATE")
+                    cursor.execute(
+                        f"SELECT rowid, {column} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                        (last_rowid, batch_size)
+                    )
+                    rows = cursor.fetchall()
+                    if not rows:
+                        conn.rollback()
+                        break
+                    updates = []
+                    for rowid, value in rows:
+                        encoded = encode_payload(decode_payload(value))
+                        if encoded != value:
+                            updates.append((encoded, rowid))
+                    cursor.executemany(f"UPDATE {table} SET {column} = ? WHERE rowid = ?", updates)
+                    conn.commit()
+                converted += len(updates)
+                last_rowid = rows[-1][0]
+        return converted
+
+    def cache_stats(self):
+        """Return hit/miss counters and size of the in-process roadmap/quiz cache."""
+        return self._hot_cache.stats()
+
+    def invalidate_chunks(self, fingerprint, chunk_ids):
+        """
+        Delete cached roadmap and quizzes for a document that reference changed chunks.
+
+        A roadmap referencing any changed chunk is deleted along with all of
+        the document's quizzes, since regenerating it renumbers the nodes.
+        Otherwise only quizzes for nodes referencing a changed chunk are deleted.
+        """
+        chunk_ids = set(chunk_ids)
+        if not chunk_ids:
+            return
+        roadmap = self.get_roadmap(fingerprint)
+        nodes = {str(node["node_id"]): node for node in roadmap["roadmap"]} if roadmap else {}
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            if any(chunk_ids & set(node["related_chunks"]) for node in nodes.values()):
+                cursor.execute("DELETE FROM roadmaps WHERE fingerprint = ?", (fingerprint,))
+                cursor.execute("DELETE FROM quizzes WHERE fingerprint = ?", (fingerprint,))
+                conn.commit()
+                self._hot_cache.evict_document(fingerprint)
+                return
+
+            cursor.execute("SELECT node_id, quiz_data FROM quizzes WHERE fingerprint = ?", (fingerprint,))
+            stale_nodes = []
+            for node_id, quiz_data in cursor.fetchall():
+                if str(node_id) in nodes:
+                    referenced = set(nodes[str(node_id)]["related_chunks"])
+                else:
+                    questions = json.loads(decode_payload(quiz_data))["quiz"]
+                    referenced = {chunk for question in questions for chunk in question["related_chunks"]}
+                if chunk_ids & referenced:
+                    stale_nodes.append((fingerprint, node_id))
+            cursor.executemany("DELETE FROM quizzes WHERE fingerprint = ? AND node_id = ?", stale_nodes)
+            conn.commit()
+        self._hot_cache.evict_document(fingerprint)
+
+    def get_upload(self, filename):
+        """Retrieve the fingerprint and collection registered for an uploaded file."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT u.filename, u.fingerprint, f.collection_name, f.ingest_pending
+                FROM uploads u JOIN fingerprints f ON f.fingerprint = u.fingerprint
+                WHERE u.filename = ?
+            """, (filename,))
+            result = cursor.fetchone()
+            if result:
+                return dict(result)
+            return None
+
+    def get_fingerprint_by_collection(self, collection_name):
+        """Retrieve the fingerprint whose content lives in a collection."""
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                "SELECT roadmap_data FROM roadmaps WHERE filename = ?",
-                (filename,)
+                "SELECT fingerprint FROM fingerprints WHERE collection_name = ?",
+                (collection_name,)
             )
             result = cursor.fetchone()
             if result:
-                return json.loads(result[0])
+                return result[0]
             return None
-            
-    def store_quiz(self, filename, node_id, quiz_data):
-        """Store a quiz in the database."""
-        with sqlite3.connect(self.db_path) as conn:
+
+    def register_upload(self, filename, fingerprint, collection_name=None):
+        """
+        Point a filename at a content fingerprint, updating reference counts.
+
+        Uploads with identical bytes share one fingerprint and so one
+        collection. A new fingerprint gets `collection_name`, or a new unique
+        name if none is given, unless a collection is being handed over. When
+        a filename's content changes and its old fingerprint is no longer
+        referenced, the new fingerprint takes over the old collection and
+        cached roadmap and quizzes, so the file can be re-ingested
+        incrementally. An old fingerprint that is released without a handover
+        is deleted and its collection returned for cleanup.
+
+        New content stays pending until create_ingest_job() queues it, so an
+        upload that fails before its job exists is queued by the next one.
+
+        Returns:
+            dict: The registered "fingerprint" and "collection_name", whether
+                the content still has to be queued for ingestion
+                ("ingest_pending"), and the "released_collection" to delete,
+                if any.
+        """
+        with self._connect() as conn:
             cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT fingerprint FROM uploads WHERE filename = ?", (filename,))
+            row = cursor.fetchone()
+            old_fingerprint = row[0] if row else None
+
+            released = None
+            if old_fingerprint is not None and old_fingerprint != fingerprint:
+                cursor.execute(
+                    "UPDATE fingerprints SET ref_count = ref_count - 1 WHERE fingerprint = ?",
+                    (old_fingerprint,)
+                )
+                cursor.execute(
+                    "SELECT ref_count, collection_name FROM fingerprints WHERE fingerprint = ?",
+                    (old_fingerprint,)
+                )
+                ref_count, old_collection = cursor.fetchone()
+                if ref_count <= 0:
+                    released = old_collection
+
+            cursor.execute("SELECT collection_name, ingest_pending FROM fingerprints WHERE fingerprint = ?", (fingerprint,))
+            row = cursor.fetchone()
+            ingest_pending = row is None or bool(row[1])
+            if row is not None:
+                collection_name = row[0]
+            elif released is not None:
+                # Hand the released collection and its cached results to the new content
+                collection_name, released = released, None
+                cursor.execute("UPDATE roadmaps SET fingerprint = ? WHERE fingerprint = ?", (fingerprint, old_fingerprint))
+                cursor.execute("UPDATE quizzes SET fingerprint = ? WHERE fingerprint = ?", (fingerprint, old_fingerprint))
+                cursor.execute("DELETE FROM fingerprints WHERE fingerprint = ?", (old_fingerprint,))
+            elif collection_name is None:
+                # Names are not derived from the content, so no two fingerprints can share one
+                collection_name = f"doc-{uuid.uuid4().hex}"
+
+            if released is not None:
+                cursor.execute("DELETE FROM fingerprints WHERE fingerprint = ?", (old_fingerprint,))
+                cursor.execute("DELETE FROM roadmaps WHERE fingerprint = ?", (old_fingerprint,))
+                cursor.execute("DELETE FROM quizzes WHERE fingerprint = ?", (old_fingerprint,))
+
+            if old_fingerprint != fingerprint:
+                cursor.execute(
+                    "INSERT INTO fingerprints (fingerprint, collection_name, ref_count, ingest_pending) VALUES (?, ?, 1, 1) "
+                    "ON CONFLICT (fingerprint) DO UPDATE SET ref_count = ref_count + 1",
+                    (fingerprint, collection_name)
+                )
+                cursor.execute(
+                    "INSERT OR REPLACE INTO uploads (filename, fingerprint) VALUES (?, ?)",
+                    (filename, fingerprint)
+                )
+            conn.commit()
+        if old_fingerprint is not None and old_fingerprint != fingerprint:
+            self._hot_cache.evict_document(old_fingerprint)
+            self._hot_cache.evict_document(fingerprint)
+
+        return {
+            "fingerprint": fingerprint,
+            "collection_name": collection_name,
+            "ingest_pending": ingest_pending,
+            "released_collection": released,
+        }
+
+    def adopt_legacy_upload(self, filename, fingerprint, collection_name):
+        """
+        Register a file uploaded before fingerprinting existed, re-keying its
+        cached roadmap and quizzes from the filename to the fingerprint.
+        """
+        upload = self.register_upload(filename, fingerprint, collection_name)
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE OR IGNORE roadmaps SET fingerprint = ? WHERE fingerprint = ?", (fingerprint, filename))
+            cursor.execute("UPDATE OR IGNORE quizzes SET fingerprint = ? WHERE fingerprint = ?", (fingerprint, filename))
+            # The file was already ingested into its collection
+            if upload["collection_name"] == collection_name:
+                cursor.execute("UPDATE fingerprints SET ingest_pending = 0 WHERE fingerprint = ?", (fingerprint,))
+                upload["ingest_pending"] = False
+            conn.commit()
+        self._hot_cache.evict_document(fingerprint)
+        return upload
+
+    def acquire_lease(self, key, owner, ttl):
+        """
+        Take the lease on a key unless another owner holds an unexpired one.
+        Leases left behind by a failed computation can be taken immediately.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT owner, expires_at, error FROM leases WHERE key = ?", (key,))
+            result = cursor.fetchone()
+            if result and result[0] != owner and result[1] > now and result[2] is None:
+                conn.rollback()
+                return False
             cursor.execute(
-                "INSERT OR REPLACE INTO quizzes (filename, node_id, quiz_data) VALUES (?, ?, ?)",
-                (filename, node_id, json.dumps(quiz_data))
+                "INSERT OR REPLACE INTO leases (key, owner, expires_at, error) VALUES (?, ?, ?, NULL)",
+                (key, owner, now + ttl)
             )
             conn.commit()
+            return True
+
+    def renew_lease(self, key, owner, ttl):
+        """Extend a lease held by owner."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE leases SET expires_at = ? WHERE key = ? AND owner = ?",
+                (time.time() + ttl, key, owner)
+            )
+            conn.commit()
+
+    def release_lease(self, key, owner):
+        """Release a lease after its computation succeeded."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+            conn.commit()
 
-    def get_quiz(self, filename, node_id):
-        """Retrieve a quiz from the database."""
-        with sqlite3.connect(self.db_path) as conn:
+    def fail_lease(self, key, owner, error):
+        """Record that a lease's computation failed so waiters can see the error."""
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                "SELECT quiz_data FROM quizzes WHERE filename = ? AND node_id = ?",
-                (filename, node_id)
+                "UPDATE leases SET error = ?, expires_at = ? WHERE key = ? AND owner = ?",
+                (error, time.time(), key, owner)
             )
+            conn.commit()
+
+    def get_lease(self, key):
+        """Retrieve a lease as a dict."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM leases WHERE key = ?", (key,))
             result = cursor.fetchone()
             if result:
-                return json.loads(result[0])
-            return None
\ No newline at end of file
+                return dict(result)
+            return None
+
+    def create_ingest_job(self, job_id, filename, file_path, collection_name, fingerprint=None, owner=None, lease_seconds=0):
+        """
+        Record a new queued ingestion job, leased to `owner` for `lease_seconds`.
+
+        If `fingerprint` is given, the job is only created while that content
+        is still pending ingestion, and creating it clears the pending flag,
+        so concurrent uploads of the same new content queue one job.
+
+        Returns:
+            bool: Whether the job was created.
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            if fingerprint is not None:
+                cursor.execute(
+                    "UPDATE fingerprints SET ingest_pending = 0 WHERE fingerprint = ? AND ingest_pending = 1",
+                    (fingerprint,)
+                )
+                if cursor.rowcount == 0:
+                    conn.rollback()
+                    return False
+            cursor.execute(
+                "INSERT INTO ingest_jobs (job_id, filename, file_path, collection_name, status, owner, lease_expires) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, filename, file_path, collection_name, owner, time.time() + lease_seconds)
+            )
+            conn.commit()
+            return True
+
+    def claim_ingest_job(self, job_id, owner, lease_seconds, status="queued"):
+        """
+        Lease an unfinished job to `owner` and set its status, unless another
+        owner holds an unexpired lease on it.
+
+        Returns:
+            bool: Whether `owner` now holds the job.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE ingest_jobs
+                SET status = ?, owner = ?, lease_expires = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE job_id = ? AND status IN ('queued', 'running')
+                AND (owner IS NULL OR owner = ? OR lease_expires < ?)
+                """,
+                (status, owner, now + lease_seconds, job_id, owner, now)
+            )
+            conn.commit()
+            return cursor.rowcount == 1
+
+    def renew_ingest_leases(self, owner, lease_seconds):
+        """Extend the leases of every unfinished job held by owner."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE ingest_jobs SET lease_expires = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                (time.time() + lease_seconds, owner)
+            )
+            conn.commit()
+
+    def update_ingest_job(self, job_id, **fields):
+        """Update the status, progress counters or error of an ingestion job."""
+        columns = ", ".join(f"{column} = ?" for column in fields)
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"UPDATE ingest_jobs SET {columns}, updated_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+                (*fields.values(), job_id)
+            )
+            conn.commit()
+
+    def get_ingest_job(self, job_id):
+        """Retrieve an ingestion job as a dict."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM ingest_jobs WHERE job_id = ?", (job_id,))
+            result = cursor.fetchone()
+            if result:
+                return dict(result)
+            return None
+
+    def get_latest_ingest_job(self, collection_name):
+        """Retrieve the most recent ingestion job for a collection."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT * FROM ingest_jobs WHERE collection_name = ? ORDER BY created_at DESC, rowid DESC LIMIT 1",
+                (collection_name,)
+            )
+            result = cursor.fetchone()
+            if result:
+                return dict(result)
+            return None
+
+    def get_unfinished_ingest_jobs(self):
+        """Retrieve queued or running jobs whose lease has expired, oldest first."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT * FROM ingest_jobs WHERE status IN ('queued', 'running') "
+                "AND (owner IS NULL OR lease_expires < ?) ORDER BY created_at, rowid",
+                (time.time(),)
+            )
+            return [dict(row) for row in cursor.fetchall()]
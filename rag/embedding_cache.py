@@ -0,0 +1,92 @@
+import os
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
+from langchain_core.embeddings import Embeddings
+
+from metrics import stage
+
+load_dotenv()
+
+# Constants
+embedding_cache_path = "./db/embedding_cache"
+query_cache_size = int(os.environ.get("EMBEDDING_QUERY_CACHE_SIZE", 1024))
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that persists every embedding it computes.
+
+    Document and query embeddings are stored in a local byte store keyed by a
+    SHA-256 hash of the text, namespaced by model name, so text is only sent
+    to the embedding model once. Query embeddings also go through an
+    in-memory LRU so repeated questions skip the byte store too.
+    """
+
+    def __init__(self, underlying, namespace, store_path=embedding_cache_path, max_queries=query_cache_size):
+        self.cached = CacheBackedEmbeddings.from_bytes_store(
+            underlying,
+            LocalFileStore(store_path),
+            namespace=namespace,
+            query_embedding_cache=True,
+            key_encoder="sha256",
+        )
+        self.max_queries = max_queries
+        self.query_hits = 0
+        self.query_misses = 0
+        self._queries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_query(self, text):
+        with self._lock:
+            embedding = self._queries.get(text)
+            if embedding is not None:
+                self._queries.move_to_end(text)
+                self.query_hits += 1
+            else:
+                self.query_misses += 1
+            return embedding
+
+    def _put_query(self, text, embedding):
+        with self._lock:
+            self._queries[text] = embedding
+            self._queries.move_to_end(text)
+            while len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+
+    def stats(self):
+        """Return hit/miss counters of the in-memory query cache for this process."""
+        with self._lock:
+            total = self.query_hits + self.query_misses
+            return {
+                "hits": self.query_hits,
+                "misses": self.query_misses,
+                "hit_rate": self.query_hits / total if total else 0.0,
+            }
+
+    def embed_documents(self, texts):
+        with stage("embed_documents", items=len(texts)):
+            return self.cached.embed_documents(texts)
+
+    async def aembed_documents(self, texts):
+        with stage("embed_documents", items=len(texts)):
+            return await self.cached.aembed_documents(texts)
+
+    def embed_query(self, text):
+        embedding = self._get_query(text)
+        if embedding is None:
+            with stage("embed_query", items=1):
+                embedding = self.cached.embed_query(text)
+            self._put_query(text, embedding)
+        return embedding
+
+    async def aembed_query(self, text):
+        embedding = self._get_query(text)
+        if embedding is None:
+            with stage("embed_query", items=1):
+                embedding = await self.cached.aembed_query(text)
+            self._put_query(text, embedding)
+        return embedding
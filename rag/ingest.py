@@ -1,101 +1,431 @@
+import hashlib
 import os
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
 from dotenv import load_dotenv
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from uuid import uuid4
 
-from models import Models
-from summary import summarize_chunk
+from lexical_index import lexical_index
+from metrics import stage, timed_iter
+from summary import summarize_chunks, summary_max_in_flight
+from vector_stores import collection_name_of, initialize_vector_store
 
 load_dotenv()
 
-# Initialize the Models
-models = Models()
-embeddings = models.embeddings_model
-llm = models.chat_model
-
 # Constants
 data_folder = "./data"
 chunk_size = 1000
 chunk_overlap = 200
 check_interval = 10
-
-def initialize_vector_store(collection_name="documents"):
-    return Chroma(
-        collection_name=collection_name,
-        embedding_function=embeddings,
-        persist_directory="./db/chrome_langchain_db"
-    )
+embedding_batch_size = int(os.environ.get("EMBEDDING_BATCH_SIZE", 64))
+embedding_workers = int(os.environ.get("EMBEDDING_WORKERS", 4))
+ingest_queue_size = int(os.environ.get("INGEST_QUEUE_SIZE", 256))
+# Minimum seconds between progress writes per stage; final counts are always written
+progress_interval = float(os.environ.get("INGEST_PROGRESS_INTERVAL_SECONDS", 1))
 
 default_vector_store = initialize_vector_store()
 
-def ingest_file(file_path, vector_store=default_vector_store):
+def ingest_file(file_path, vector_store=default_vector_store, progress=None):
+    """
+    Load, split, summarize and embed a PDF into the given vector store.
+
+    The file is processed as a streaming pipeline: pages are read lazily one
+    at a time, split, summarized and then embedded and upserted in batches.
+    Each stage runs on its own thread with a bounded queue in between, so
+    memory stays flat for large files and the first chunks are searchable
+    before the last page is parsed.
+
+    Args:
+        file_path (str): Path to the PDF file.
+        vector_store: The collection to write chunks to.
+        progress (callable): Optional callback called as progress(stage, count)
+            with stage one of "pages_parsed", "chunks_total",
+            "chunks_summarized" or "chunks_embedded".
+
+    Re-ingesting into a collection that already holds the file is incremental:
+    chunks whose content hash is unchanged are skipped, and chunks that no
+    longer exist are deleted. The collection's lexical index is updated
+    alongside the vector store.
+
+    Returns:
+        dict: Chunk IDs that were "added", "changed" and "deleted", plus the
+            number left "unchanged".
+    """
     if not file_path.lower().endswith(".pdf"):
         raise ValueError("Only PDF files are supported.")
 
+    report = ThrottledProgress(progress)
+
+    existing = vector_store.get(include=["metadatas"])
+    existing_hashes = {
+        chunk_id: metadata.get('content_hash')
+        for chunk_id, metadata in zip(existing['ids'], existing['metadatas'])
+    }
+    changes = {"added": [], "changed": [], "deleted": [], "unchanged": 0}
+    collection_name = collection_name_of(vector_store)
+
     loader = PyPDFLoader(file_path)
-    loaded_documents = loader.load()
+    pages = timed_iter(loader.lazy_load(), "pdf_parse")
+    chunks = _background_stage(split_pages(pages, file_path, report), ingest_queue_size)
+    new_chunks = skip_unchanged(chunks, existing_hashes, changes)
+    summarized = _background_stage(summarize_documents(new_chunks, report), ingest_queue_size)
+    try:
+        upsert_in_batches(
+            summarized,
+            vector_store,
+            on_progress=lambda done: report("chunks_embedded", done),
+            on_batch=lambda batch: lexical_index.index(collection_name, batch),
+        )
+    finally:
+        report.flush()
+
+    # Whatever was not seen in this pass no longer exists in the file
+    changes["deleted"] = list(existing_hashes)
+    if changes["deleted"]:
+        with stage("vector_delete", items=len(changes["deleted"])):
+            vector_store.delete(ids=changes["deleted"])
+        with stage("lexical_index", items=len(changes["deleted"])):
+            lexical_index.delete(collection_name, changes["deleted"])
+    return changes
+
+class ThrottledProgress:
+    """
+    Forwards progress(stage, count) calls at most once per `interval` seconds
+    per stage, so a large file doesn't write its job row for every page and
+    chunk. flush() writes the latest counts that were held back.
+    """
+
+    def __init__(self, progress, interval=progress_interval):
+        self.progress = progress
+        self.interval = interval
+        self._latest = {}
+        self._written = {}
+        self._written_at = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, name, count):
+        if self.progress is None:
+            return
+        with self._lock:
+            self._latest[name] = count
+            now = time.monotonic()
+            if name in self._written_at and now - self._written_at[name] < self.interval:
+                return
+            self._write(name, count, now)
+
+    def _write(self, name, count, now):
+        # Called with the lock held, so counts reach the callback in order
+        self.progress(name, count)
+        self._written[name] = count
+        self._written_at[name] = now
+
+    def flush(self):
+        if self.progress is None:
+            return
+        with self._lock:
+            for name, count in self._latest.items():
+                if self._written.get(name) != count:
+                    self._write(name, count, time.monotonic())
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def skip_unchanged(documents, existing_hashes, changes):
+    """
+    Yield only chunks that are new or whose content changed.
+
+    Seen chunk IDs are removed from `existing_hashes`, leaving the orphans,
+    and `changes` is filled in as chunks are classified.
+    """
+    for document in documents:
+        chunk_id = document.metadata['chunk_id']
+        if chunk_id not in existing_hashes:
+            changes["added"].append(chunk_id)
+        elif existing_hashes.pop(chunk_id) == document.metadata['content_hash']:
+            changes["unchanged"] += 1
+            continue
+        else:
+            changes["changed"].append(chunk_id)
+        yield document
+
+def split_pages(pages, file_path, report):
+    """Split pages into chunks as they are loaded, assigning chunk IDs."""
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
         separators=["\n\n", "\n", " ", ""],
     )
-
-    documents = text_splitter.split_documents(loaded_documents)
     chunks_by_page = {}
+    pages_parsed = 0
+    chunks_total = 0
 
-    for i in range(len(documents)):
-        page_num = documents[i].metadata['page']
-        if page_num not in chunks_by_page:
-            chunks_by_page[page_num] = 1
-        else:
-            chunks_by_page[page_num] += 1
-        
-        metadata = {
-            "source": file_path,
-            "page": page_num,
-            "chunk_id": f"{page_num}:{chunks_by_page[page_num]}"
-        }
-        documents[i].metadata = metadata
-        
-        chunk_summary = summarize_chunk(documents[i].page_content)
-        documents[i].metadata['summary'] = chunk_summary.summary
-        documents[i].metadata['topic'] = chunk_summary.topic
-        documents[i].metadata['keywords'] = chunk_summary.keywords
-    
-    vector_store.add_documents(documents)
+    for page in pages:
+        pages_parsed += 1
+        report("pages_parsed", pages_parsed)
+        with stage("split"):
+            page_chunks = text_splitter.split_documents([page])
+        for document in page_chunks:
+            page_num = document.metadata['page']
+            if page_num not in chunks_by_page:
+                chunks_by_page[page_num] = 1
+            else:
+                chunks_by_page[page_num] += 1
+
+            document.metadata = {
+                "source": file_path,
+                "page": page_num,
+                "chunk_id": f"{page_num}:{chunks_by_page[page_num]}",
+                "chunk_index": chunks_by_page[page_num],
+                "content_hash": content_hash(document.page_content)
+            }
+            chunks_total += 1
+            report("chunks_total", chunks_total)
+            yield document
+
+def summarize_documents(documents, report):
+    """Attach a summary, topic and keywords to each chunk, a window at a time."""
+    documents = iter(documents)
+    summarized = 0
+
+    while window := list(islice(documents, summary_max_in_flight)):
+        with stage("summarize", items=len(window)):
+            summaries = summarize_chunks([document.page_content for document in window])
+        for document, chunk_summary in zip(window, summaries):
+            if isinstance(chunk_summary, dict):
+                raise RuntimeError(
+                    f"Failed to summarize chunk {document.metadata['chunk_id']}: {chunk_summary['error']}"
+                )
+            document.metadata['summary'] = chunk_summary.summary
+            document.metadata['topic'] = chunk_summary.topic
+            document.metadata['keywords'] = chunk_summary.keywords
+            yield document
+        summarized += len(window)
+        report("chunks_summarized", summarized)
+
+class _StageError:
+    def __init__(self, error):
+        self.error = error
+
+_end_of_stage = object()
+
+def _background_stage(items, maxsize):
+    """
+    Run an iterator on a background thread, yielding its items through a
+    bounded queue. Errors are re-raised in the consumer, and closing the
+    returned generator stops the background thread.
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+            put(_end_of_stage)
+        except Exception as e:
+            put(_StageError(e))
+        finally:
+            if hasattr(items, "close"):
+                items.close()
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _end_of_stage:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stopped.set()
+
+def _upsert_batch(vector_store, batch, on_batch=None):
+    # Chunk IDs are unique within a collection, so use them as the Chroma IDs
+    # to allow direct lookups by ID.
+    # Includes embedding the batch, which is also timed on its own as "embed_documents"
+    with stage("vector_upsert", items=len(batch)):
+        vector_store.add_documents(batch, ids=[document.metadata['chunk_id'] for document in batch])
+    if on_batch:
+        on_batch(batch)
+    return len(batch)
+
+def upsert_in_batches(documents, vector_store, batch_size=None, max_workers=None, on_progress=None, on_batch=None):
+    """
+    Embed and upsert documents in fixed-size batches on a thread pool.
+
+    Each batch is written to the vector store as soon as its embeddings come
+    back, and at most `max_workers` batches are in flight at once, so memory
+    stays bounded by the batch size rather than the document size.
+
+    Args:
+        documents (iterable): Chunks to embed; may be a generator.
+        vector_store: The collection to write to.
+        batch_size (int): Chunks per embedding request.
+        max_workers (int): Number of batches embedded concurrently.
+        on_progress (callable): Called with the number of chunks written so far.
+        on_batch (callable): Called with each batch once it has been written.
+
+    Returns:
+        int: The number of chunks written.
+    """
+    batch_size = batch_size or embedding_batch_size
+    max_workers = max_workers or embedding_workers
+    documents = iter(documents)
+    embedded = 0
+    pending = set()
+
+    def collect(done):
+        nonlocal embedded
+        for future in done:
+            embedded += future.result()
+        if on_progress:
+            on_progress(embedded)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embed") as executor:
+        while batch := list(islice(documents, batch_size)):
+            if len(pending) >= max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(_upsert_batch, vector_store, batch, on_batch))
+        if pending:
+            collect(wait(pending).done)
+    return embedded
 
 def search_documents_with_score(query, vector_store=default_vector_store, k=4):
     return vector_store.similarity_search_with_score(query, k=k)
 
+def return_chunks_by_ids(chunk_ids, vector_store=default_vector_store):
+    """
+    Fetch several chunks in a single query.
+
+    Args:
+        chunk_ids (list[str]): Chunk IDs in "page:index" form.
+        vector_store: The collection to read from.
+
+    Returns:
+        dict: Maps each found chunk ID to {"metadata": ..., "content": ...}.
+    """
+    chunk_ids = list(dict.fromkeys(chunk_ids))
+    if not chunk_ids:
+        return {}
+
+    with stage("vector_get", items=len(chunk_ids)):
+        chunks = vector_store.get(ids=chunk_ids, include=["metadatas", "documents"])
+    found = {
+        metadata['chunk_id']: {"metadata": metadata, "content": document}
+        for metadata, document in zip(chunks['metadatas'], chunks['documents'])
+    }
+
+    # Collections ingested before chunk IDs were used as Chroma IDs have random
+    # IDs, so fall back to a metadata filter for anything not found directly.
+    missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in found]
+    if missing:
+        chunks = vector_store.get(where={"chunk_id": {"$in": missing}}, include=["metadatas", "documents"])
+        for metadata, document in zip(chunks['metadatas'], chunks['documents']):
+            found[metadata['chunk_id']] = {"metadata": metadata, "content": document}
+    return found
+
 def return_chunk_by_id(chunk_id, vector_store=default_vector_store):
-    chunks = vector_store.get(include=["metadatas", "documents"])
-    metadatas = chunks['metadatas']
-    documents = chunks['documents']
-    
-    for metadata, document in zip(metadatas, documents):
-        if metadata['chunk_id'] == chunk_id:
-            return {
-                "metadata": metadata,
-                "content": document
-            }
-    return None
+    return return_chunks_by_ids([chunk_id], vector_store).get(chunk_id)
+
+def chunk_sort_key(metadata):
+    # Older chunks have no chunk_index, so fall back to parsing the chunk ID
+    chunk_index = metadata.get('chunk_index')
+    if chunk_index is None:
+        chunk_index = int(metadata['chunk_id'].split(':')[1])
+    return (metadata['page'], chunk_index)
 
 def return_documents_summary(vector_store=default_vector_store):
-    chunks = vector_store.get(include=["metadatas"])
+    with stage("vector_get"):
+        chunks = vector_store.get(include=["metadatas"])
     metadatas = chunks['metadatas']
-    sorted_metadatas = sorted(metadatas, key=lambda x: (x['page'], int(x['chunk_id'].split(':')[1])))
+    sorted_metadatas = sorted(metadatas, key=chunk_sort_key)
     return sorted_metadatas
 
-def condensed_metadata(vector_store=default_vector_store):
-    metadata = return_documents_summary(vector_store)
-    formatted_metadata = ""
+def estimate_tokens(text):
+    """Rough token count, assuming ~4 characters per token."""
+    return len(text) // 4
+
+def condensed_metadata(vector_store=default_vector_store, token_budget=None, tokenizer=estimate_tokens):
+    text, _ = build_condensed_metadata(return_documents_summary(vector_store), token_budget, tokenizer)
+    return text
+
+def _format_chunk(data, include_summary=True):
+    piece = (
+        f"Chunk ID: {data['chunk_id']}\n"
+        f"Keywords for this chunk: {data['keywords']}\n"
+        f"Topic of this chunk: {data['topic']}\n"
+    )
+    if include_summary:
+        piece += f"Summary of this chunk: {data['summary']}\n"
+    return piece + "---\n"
+
+def _collapse_topics(metadata):
+    """Merge runs of adjacent chunks that share a topic into one entry."""
+    collapsed = []
     for data in metadata:
-        formatted_metadata += f"Chunk ID: {data['chunk_id']}\n"
-        formatted_metadata += f"Keywords for this chunk: {data['keywords']}\n"
-        formatted_metadata += f"Topic of this chunk: {data['topic']}\n"
-        formatted_metadata += f"Summary of this chunk: {data['summary']}\n"
-        formatted_metadata += "---\n"
-    return formatted_metadata
\ No newline at end of file
+        previous = collapsed[-1] if collapsed else None
+        if previous and previous['topic'].strip().lower() == data['topic'].strip().lower():
+            previous['chunk_id'] += f", {data['chunk_id']}"
+            keywords = [keyword.strip() for keyword in previous['keywords'].split(',')]
+            keywords += [keyword.strip() for keyword in data['keywords'].split(',') if keyword.strip() not in keywords]
+            previous['keywords'] = ", ".join(keywords)
+        else:
+            collapsed.append(dict(data))
+    return collapsed
+
+def build_condensed_metadata(metadata, token_budget=None, tokenizer=estimate_tokens):
+    """
+    Render chunk metadata for the roadmap prompt within a token budget.
+
+    If the full rendering is over budget, the output is shrunk step by step:
+    runs of adjacent chunks with the same topic are collapsed into one entry
+    (keeping the first summary), then summaries are dropped, and finally
+    entries are sampled evenly across the document until it fits.
+
+    Args:
+        metadata (list[dict]): Chunk metadata in document order.
+        token_budget (int): Maximum tokens to produce, or None for no limit.
+        tokenizer (callable): Returns the token count of a string.
+
+    Returns:
+        tuple: The rendered text and its token count.
+    """
+    pieces = [_format_chunk(data) for data in metadata]
+    counts = [tokenizer(piece) for piece in pieces]
+    if token_budget is None or sum(counts) <= token_budget:
+        return "".join(pieces), sum(counts)
+
+    collapsed = _collapse_topics(metadata)
+    for include_summary in (True, False):
+        pieces = [_format_chunk(data, include_summary) for data in collapsed]
+        counts = [tokenizer(piece) for piece in pieces]
+        if sum(counts) <= token_budget:
+            return "".join(pieces), sum(counts)
+
+    # Still over budget: keep an even spread of entries across the document
+    keep = max(1, len(pieces) * token_budget // sum(counts))
+    while keep > 1:
+        step = len(pieces) / keep
+        indices = [int(i * step) for i in range(keep)]
+        if sum(counts[i] for i in indices) <= token_budget:
+            break
+        keep -= 1
+    else:
+        indices = [0]
+    return "".join(pieces[i] for i in indices), sum(counts[i] for i in indices)
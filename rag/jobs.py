@@ -0,0 +1,234 @@
+import asyncio
+import itertools
+import os
+import queue
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from answer_cache import answer_cache
+from ingest import ingest_file, initialize_vector_store
+from quiz import acreate_quiz, create_quiz
+
+load_dotenv()
+
+# Number of files ingested concurrently
+ingest_workers = int(os.environ.get("INGEST_WORKERS", 2))
+# Seconds an ingestion job stays leased to its worker process without a heartbeat
+ingest_lease_seconds = float(os.environ.get("INGEST_JOB_LEASE_SECONDS", 60))
+# Number of quizzes generated concurrently in the background
+quiz_pregen_workers = int(os.environ.get("QUIZ_PREGEN_WORKERS", 3))
+
+
+class IngestJobQueue:
+    """
+    Runs ingest_file on a local worker pool and tracks each job in DBManager.
+
+    Jobs move through "queued", "running" and then "completed" or "failed",
+    and their per-stage progress counters are written as the pipeline runs.
+    Each unfinished job is leased to the process that queued it, which renews
+    the lease from a heartbeat thread. Once resume_unfinished() has been
+    called, the queue also claims jobs whose lease expired because their
+    process died, so with several worker processes every job runs once.
+    """
+
+    def __init__(self, db_manager, max_workers=ingest_workers, lease_seconds=ingest_lease_seconds):
+        self.db_manager = db_manager
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self.owner = uuid.uuid4().hex
+        self.lease_seconds = lease_seconds
+        self._resuming = False
+        # Jobs this process has queued or is running, so a job claimed twice runs once
+        self._submitted = set()
+        self._submitted_lock = threading.Lock()
+        self._stopped = threading.Event()
+        threading.Thread(target=self._heartbeat, daemon=True).start()
+
+    def submit(self, filename, file_path, collection_name, fingerprint=None):
+        """
+        Queue a file for ingestion and return its job ID.
+
+        If `fingerprint` is given, the file is only queued while its content
+        is pending ingestion; None is returned if another upload queued it.
+        """
+        job_id = uuid.uuid4().hex
+        created = self.db_manager.create_ingest_job(
+            job_id, filename, file_path, collection_name, fingerprint,
+            owner=self.owner, lease_seconds=self.lease_seconds
+        )
+        if not created:
+            return None
+        self._queue(job_id, filename, file_path, collection_name)
+        return job_id
+
+    def resume_unfinished(self):
+        """
+        Claim and re-queue jobs whose process stopped renewing their lease,
+        then keep doing so from the heartbeat thread.
+        """
+        self._resuming = True
+        for job in self.db_manager.get_unfinished_ingest_jobs():
+            # Another worker process may claim the same job first
+            if self.db_manager.claim_ingest_job(job["job_id"], self.owner, self.lease_seconds):
+                self._queue(job["job_id"], job["filename"], job["file_path"], job["collection_name"])
+
+    def get(self, job_id):
+        return self.db_manager.get_ingest_job(job_id)
+
+    def shutdown(self):
+        self._stopped.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _queue(self, job_id, filename, file_path, collection_name):
+        """Submit a job to the worker pool unless this process already has it."""
+        with self._submitted_lock:
+            if job_id in self._submitted:
+                return
+            self._submitted.add(job_id)
+        self.executor.submit(self._run_submitted, job_id, filename, file_path, collection_name)
+
+    def _run_submitted(self, job_id, filename, file_path, collection_name):
+        try:
+            self._run(job_id, filename, file_path, collection_name)
+        finally:
+            with self._submitted_lock:
+                self._submitted.discard(job_id)
+
+    def _heartbeat(self):
+        while not self._stopped.wait(self.lease_seconds / 3):
+            try:
+                self.db_manager.renew_ingest_leases(self.owner, self.lease_seconds)
+                if self._resuming:
+                    self.resume_unfinished()
+            except Exception as e:
+                print(f"Error renewing ingestion job leases: {e}")
+
+    def _run(self, job_id, filename, file_path, collection_name):
+        # Skip the job if this process lost its lease to another one
+        if not self.db_manager.claim_ingest_job(job_id, self.owner, self.lease_seconds, status="running"):
+            return
+        self.db_manager.update_ingest_job(job_id, error=None)
+
+        def progress(stage, count):
+            self.db_manager.update_ingest_job(job_id, **{stage: count})
+
+        try:
+            vector_store = initialize_vector_store(collection_name=collection_name)
+            changes = ingest_file(file_path, vector_store=vector_store, progress=progress)
+            # Drop cached roadmaps and quizzes built from chunks that changed
+            fingerprint = self.db_manager.get_fingerprint_by_collection(collection_name)
+            if fingerprint:
+                self.db_manager.invalidate_chunks(fingerprint, changes["changed"] + changes["deleted"])
+            # Answers may cite content that changed, so start the collection's cache over
+            if changes["added"] or changes["changed"] or changes["deleted"]:
+                answer_cache.invalidate(collection_name)
+            self.db_manager.update_ingest_job(job_id, status="completed")
+        except Exception as e:
+            print(f"Error ingesting {file_path}: {e}")
+            self.db_manager.update_ingest_job(job_id, status="failed", error=str(e))
+
+
+class QuizPregenerator:
+    """
+    Generates quizzes for every node of a new roadmap in the background.
+
+    Jobs wait in a priority queue ordered by node position, so the first
+    nodes of every roadmap are generated before later ones, and at most
+    `max_workers` quizzes are generated at once. A quiz requested while its
+    job is still queued is moved to the front of the queue. Generation goes
+    through `single_flight`, so it is never duplicated by a /quiz request or
+    another worker process.
+    """
+
+    def __init__(self, db_manager, single_flight, max_workers=quiz_pregen_workers):
+        self.db_manager = db_manager
+        self.single_flight = single_flight
+        self._queue = queue.PriorityQueue()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._order = itertools.count()
+        for _ in range(max_workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def schedule(self, fingerprint, collection_name, roadmap):
+        """Queue quiz generation for every node of a roadmap."""
+        for position, node in enumerate(roadmap["roadmap"], start=1):
+            self._enqueue(position, fingerprint, collection_name, node)
+
+    def in_flight(self, fingerprint, collection_name, node):
+        """
+        Return the Future of a queued or running quiz job, moving it to the
+        front of the queue, or None if no job exists for the node.
+        """
+        return self._enqueue(0, fingerprint, collection_name, node, create=False)
+
+    def generate(self, fingerprint, collection_name, node):
+        """Return the stored quiz for a node, generating and storing it once if missing."""
+        node_id = node["node_id"]
+
+        def compute():
+            quiz = create_quiz(node, collection_name)
+            if not quiz:
+                raise RuntimeError("Failed to create quiz")
+            self.db_manager.store_quiz(fingerprint, node_id, quiz)
+            return quiz
+
+        return self.single_flight.do(
+            f"quiz:{fingerprint}:{node_id}",
+            compute,
+            lambda: self.db_manager.get_quiz(fingerprint, node_id),
+        )
+
+    async def agenerate(self, fingerprint, collection_name, node):
+        """Async version of generate() for callers on an event loop."""
+        node_id = node["node_id"]
+
+        async def compute():
+            quiz = await acreate_quiz(node, collection_name)
+            if not quiz:
+                raise RuntimeError("Failed to create quiz")
+            await asyncio.to_thread(self.db_manager.store_quiz, fingerprint, node_id, quiz)
+            return quiz
+
+        return await self.single_flight.ado(
+            f"quiz:{fingerprint}:{node_id}",
+            compute,
+            lambda: self.db_manager.get_quiz(fingerprint, node_id),
+        )
+
+    def _enqueue(self, priority, fingerprint, collection_name, node, create=True):
+        key = (fingerprint, str(node["node_id"]))
+        with self._lock:
+            future = self._jobs.get(key)
+            if future is None:
+                # Checked under the same lock hold, so a job that just finished is not queued again
+                if not create:
+                    return None
+                future = Future()
+                self._jobs[key] = future
+            elif future.running() or future.done():
+                return future
+            # A re-prioritized job may be queued twice; workers skip the stale entry
+            self._queue.put((priority, next(self._order), key, collection_name, node))
+        return future
+
+    def _worker(self):
+        while True:
+            _, _, key, collection_name, node = self._queue.get()
+            with self._lock:
+                future = self._jobs.get(key)
+                if future is None or future.running() or future.done():
+                    continue
+                future.set_running_or_notify_cancel()
+
+            fingerprint, node_id = key
+            try:
+                future.set_result(self.generate(fingerprint, collection_name, node))
+            except Exception as e:
+                print(f"Error pre-generating quiz for node {node_id}: {e}")
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._jobs.pop(key, None)
@@ -0,0 +1,184 @@
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from heapq import nlargest
+
+from dotenv import load_dotenv
+
+from db_manager import db_busy_timeout_ms
+from metrics import stage
+
+load_dotenv()
+
+# Constants
+lexical_index_path = "./db/lexical_index.db"
+# BM25 term frequency saturation and length normalization
+bm25_k1 = 1.2
+bm25_b = 0.75
+
+# Words, numbers and dotted/dashed identifiers such as "12.3" or "s-2021"
+token_pattern = re.compile(r"\w+(?:[.\-/:]\w+)*")
+
+def tokenize(text):
+    """
+    Split text into lowercase terms for the lexical index.
+
+    Compound identifiers like section numbers are kept whole and also split
+    into their parts, so "12.3" matches queries for "12.3" and for "12".
+    """
+    terms = []
+    for token in token_pattern.findall(text.lower()):
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(re.findall(r"\w+", token))
+    return terms
+
+
+class LexicalIndex:
+    """
+    Persistent BM25 inverted index of chunks, one per collection.
+
+    Postings are stored in SQLite next to the other caches and keyed by
+    collection name and chunk ID, so re-ingesting a file only replaces the
+    chunks that changed. Searching needs no embedding call. Each thread uses
+    its own WAL connection with a busy timeout, so embedding threads and
+    ingest workers can index concurrently.
+    """
+
+    def __init__(self, db_path=lexical_index_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._init_db()
+
+    def _connect(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=db_busy_timeout_ms / 1000)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        """Initialize the database with required tables."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS lexical_docs (
+                    collection_name TEXT,
+                    chunk_id TEXT,
+                    length INTEGER,
+                    PRIMARY KEY (collection_name, chunk_id)
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS lexical_postings (
+                    collection_name TEXT,
+                    term TEXT,
+                    chunk_id TEXT,
+                    tf INTEGER,
+                    PRIMARY KEY (collection_name, term, chunk_id)
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_lexical_postings_chunk
+                ON lexical_postings (collection_name, chunk_id)
+            """)
+            conn.commit()
+
+    @staticmethod
+    def _delete_chunks(cursor, collection_name, chunk_ids):
+        rows = [(collection_name, chunk_id) for chunk_id in chunk_ids]
+        cursor.executemany("DELETE FROM lexical_postings WHERE collection_name = ? AND chunk_id = ?", rows)
+        cursor.executemany("DELETE FROM lexical_docs WHERE collection_name = ? AND chunk_id = ?", rows)
+
+    def index(self, collection_name, documents):
+        """
+        Add or replace chunks in a collection's index.
+
+        Args:
+            collection_name (str): The collection the chunks belong to.
+            documents (list[Document]): Chunks with a "chunk_id" in their metadata.
+        """
+        docs = []
+        postings = []
+        for document in documents:
+            chunk_id = document.metadata['chunk_id']
+            terms = Counter(tokenize(document.page_content))
+            docs.append((collection_name, chunk_id, sum(terms.values())))
+            postings.extend((collection_name, term, chunk_id, tf) for term, tf in terms.items())
+
+        with stage("lexical_index", items=len(docs)), self._connect() as conn:
+            cursor = conn.cursor()
+            self._delete_chunks(cursor, collection_name, [doc[1] for doc in docs])
+            cursor.executemany("INSERT INTO lexical_docs (collection_name, chunk_id, length) VALUES (?, ?, ?)", docs)
+            cursor.executemany(
+                "INSERT INTO lexical_postings (collection_name, term, chunk_id, tf) VALUES (?, ?, ?, ?)",
+                postings
+            )
+            conn.commit()
+
+    def delete(self, collection_name, chunk_ids):
+        """Remove chunks from a collection's index."""
+        with self._connect() as conn:
+            self._delete_chunks(conn.cursor(), collection_name, chunk_ids)
+            conn.commit()
+
+    def drop(self, collection_name):
+        """Remove a collection's whole index."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM lexical_postings WHERE collection_name = ?", (collection_name,))
+            cursor.execute("DELETE FROM lexical_docs WHERE collection_name = ?", (collection_name,))
+            conn.commit()
+
+    def count(self, collection_name):
+        """Return the number of chunks indexed for a collection."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM lexical_docs WHERE collection_name = ?", (collection_name,))
+            return cursor.fetchone()[0]
+
+    def search(self, collection_name, query, k=4):
+        """
+        Rank a collection's chunks against a query with BM25.
+
+        Returns:
+            list[tuple[str, float]]: Up to k (chunk_id, score) pairs, best first.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        placeholders = ", ".join("?" * len(terms))
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT COUNT(*), AVG(length) FROM lexical_docs WHERE collection_name = ?",
+                (collection_name,)
+            )
+            total_docs, avg_length = cursor.fetchone()
+            if not total_docs:
+                return []
+            cursor.execute(f"""
+                SELECT p.term, p.chunk_id, p.tf, d.length
+                FROM lexical_postings p
+                JOIN lexical_docs d ON d.collection_name = p.collection_name AND d.chunk_id = p.chunk_id
+                WHERE p.collection_name = ? AND p.term IN ({placeholders})
+            """, (collection_name, *terms))
+            rows = cursor.fetchall()
+
+        doc_freq = Counter(term for term, _, _, _ in rows)
+        scores = defaultdict(float)
+        for term, chunk_id, tf, length in rows:
+            df = doc_freq[term]
+            idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+            norm = bm25_k1 * (1 - bm25_b + bm25_b * length / (avg_length or 1))
+            scores[chunk_id] += idf * tf * (bm25_k1 + 1) / (tf + norm)
+        return nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+lexical_index = LexicalIndex()
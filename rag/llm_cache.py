@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from db_manager import db_busy_timeout_ms
+from metrics import record_chain
+
+load_dotenv()
+
+# Constants
+llm_cache_path = "./db/llm_cache.db"
+llm_cache_max_bytes = int(os.environ.get("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Eviction frees space down to this fraction of max_bytes, so it runs rarely
+llm_cache_evict_to = 0.9
+# Cache hits update last_used in batches of this many keys, or after this many seconds
+last_used_flush_size = 256
+last_used_flush_seconds = 30
+
+
+class LLMCache:
+    """
+    Persistent cache of LLM responses keyed by model, template and prompt.
+
+    Responses are stored in SQLite next to the roadmap database, through one
+    WAL connection per thread, so lookups never block on writers. The total
+    size of stored responses is kept in its own row and updated with every
+    write; when it passes `max_bytes`, the least recently used entries are
+    evicted. Hits only record their key in memory, and last_used is written
+    in batches. Hit and miss counts are kept per process.
+    """
+
+    def __init__(self, db_path=llm_cache_path, max_bytes=llm_cache_max_bytes):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._touched = {}
+        self._last_flush = time.monotonic()
+        self._init_db()
+
+    def _connect(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=db_busy_timeout_ms / 1000)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        """Initialize the database with required tables."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    template_id TEXT,
+                    response TEXT,
+                    size INTEGER,
+                    last_used REAL
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache_size (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    total INTEGER
+                )
+            """)
+            # Caches created before the total was tracked are summed once
+            cursor.execute("INSERT OR IGNORE INTO llm_cache_size (id, total) SELECT 0, COALESCE(SUM(size), 0) FROM llm_cache")
+            conn.commit()
+
+    @staticmethod
+    def make_key(model_name, template_id, prompt):
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return f"{model_name}:{template_id}:{prompt_hash}"
+
+    def get(self, key):
+        """Return the cached response for a key, or None."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT response FROM llm_cache WHERE key = ?", (key,))
+            result = cursor.fetchone()
+        with self._lock:
+            if result:
+                self.hits += 1
+                self._touched[key] = time.time()
+            else:
+                self.misses += 1
+            flush = len(self._touched) >= last_used_flush_size or (
+                self._touched and time.monotonic() - self._last_flush >= last_used_flush_seconds
+            )
+        if flush:
+            self.flush_last_used()
+        return result[0] if result else None
+
+    def flush_last_used(self, cursor=None):
+        """Write the last_used times of recent hits."""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._last_flush = time.monotonic()
+        if not touched:
+            return
+        rows = [(last_used, key) for key, last_used in touched.items()]
+        if cursor is not None:
+            cursor.executemany("UPDATE llm_cache SET last_used = MAX(last_used, ?) WHERE key = ?", rows)
+            return
+        with self._connect() as conn:
+            conn.executemany("UPDATE llm_cache SET last_used = MAX(last_used, ?) WHERE key = ?", rows)
+
+    def put(self, key, model_name, template_id, response):
+        """Store a response and evict old entries if over the size limit."""
+        size = len(response.encode("utf-8"))
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT size FROM llm_cache WHERE key = ?", (key,))
+            replaced = cursor.fetchone()
+            cursor.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, template_id, response, size, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, template_id, response, size, time.time())
+            )
+            cursor.execute(
+                "UPDATE llm_cache_size SET total = total + ? WHERE id = 0",
+                (size - (replaced[0] if replaced else 0),)
+            )
+            cursor.execute("SELECT total FROM llm_cache_size WHERE id = 0")
+            if cursor.fetchone()[0] > self.max_bytes:
+                # Evict by up-to-date recency, then re-count what is left
+                self.flush_last_used(cursor)
+                cursor.execute("""
+                    DELETE FROM llm_cache WHERE key IN (
+                        SELECT key FROM (
+                            SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS running_size
+                            FROM llm_cache
+                        ) WHERE running_size > ?
+                    )
+                """, (int(self.max_bytes * llm_cache_evict_to),))
+                cursor.execute("UPDATE llm_cache_size SET total = (SELECT COALESCE(SUM(size), 0) FROM llm_cache) WHERE id = 0")
+            conn.commit()
+
+    def stats(self):
+        """Return hit/miss counters for this process."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+llm_cache = LLMCache()
+
+def _model_name(model):
+    return getattr(model, "model_name", None) or getattr(model, "model", None) or type(model).__name__
+
+def cached_llm(model, template_id, parser=None, cache=llm_cache):
+    """
+    Wrap a chat model so identical prompts are answered from the cache.
+
+    Use in place of `model | parser` in a chain. The raw model output is
+    cached only once it has parsed successfully, so a malformed response is
+    never replayed.
+
+    Args:
+        model: The chat model to call on a cache miss.
+        template_id (str): Identifies the prompt template in the cache key.
+        parser: Optional output parser applied to the model output.
+        cache (LLMCache): The cache to use.
+
+    Returns:
+        Runnable: Takes a prompt value and returns the (parsed) model output.
+    """
+    model_name = _model_name(model)
+
+    def finish(content):
+        return parser.parse(content) if parser else AIMessage(content=content)
+
+    def lookup(key):
+        try:
+            return cache.get(key)
+        except sqlite3.Error as e:
+            print(f"Error reading LLM cache: {e}")
+            return None
+
+    def store(key, content):
+        # A failed cache write must not fail the call that produced the response
+        try:
+            cache.put(key, model_name, template_id, content)
+        except sqlite3.Error as e:
+            print(f"Error writing LLM cache: {e}")
+
+    def invoke(prompt_value):
+        start = time.perf_counter()
+        key = cache.make_key(model_name, template_id, prompt_value.to_string())
+        content = lookup(key)
+        if content is not None:
+            result = finish(content)
+            record_chain(template_id, time.perf_counter() - start, cached=True)
+            return result
+        content = model.invoke(prompt_value).content
+        result = finish(content)
+        store(key, content)
+        record_chain(template_id, time.perf_counter() - start, cached=False)
+        return result
+
+    async def ainvoke(prompt_value):
+        start = time.perf_counter()
+        key = cache.make_key(model_name, template_id, prompt_value.to_string())
+        # SQLite calls block, so they run off the event loop
+        content = await asyncio.to_thread(lookup, key)
+        if content is not None:
+            result = finish(content)
+            record_chain(template_id, time.perf_counter() - start, cached=True)
+            return result
+        content = (await model.ainvoke(prompt_value)).content
+        result = finish(content)
+        await asyncio.to_thread(store, key, content)
+        record_chain(template_id, time.perf_counter() - start, cached=False)
+        return result
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=f"cached_{template_id}")
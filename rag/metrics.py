@@ -0,0 +1,316 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+
+load_dotenv()
+
+# Print one JSON line per HTTP request with its stage timings and token counts
+request_log_enabled = os.environ.get("REQUEST_LOG", "true").lower() == "true"
+default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, labels, value) for labels, value in self._values.items()]
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observations per label set."""
+
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=default_buckets):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            counts = [c + (value <= bound) for c, bound in zip(counts, self.buckets)]
+            self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for labels, (counts, total, count) in self._values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    samples.append((f"{self.name}_bucket", labels + (("le", repr(float(bound))),), bucket_count))
+                samples.append((f"{self.name}_bucket", labels + (("le", "+Inf"),), count))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Holds the process's metrics and renders them in the Prometheus text format.
+
+    Besides counters and histograms, caches that keep their own hit/miss
+    counters can be registered and are read when the metrics are rendered.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._caches = {}
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=default_buckets):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_cache(self, name, stats):
+        """Export a cache's stats() dict ({"hits", "misses", ...}) as metrics."""
+        self._caches[name] = stats
+
+    def _cache_metrics(self):
+        families = {
+            "rag_cache_hits_total": ("counter", "Cache hits since the process started.", []),
+            "rag_cache_misses_total": ("counter", "Cache misses since the process started.", []),
+            "rag_cache_hit_ratio": ("gauge", "Fraction of cache lookups that hit.", []),
+        }
+        for name, stats in self._caches.items():
+            try:
+                values = stats()
+            except Exception as e:
+                print(f"Error reading {name} cache stats: {e}")
+                continue
+            labels = (("cache", name),)
+            families["rag_cache_hits_total"][2].append((labels, values["hits"]))
+            families["rag_cache_misses_total"][2].append((labels, values["misses"]))
+            families["rag_cache_hit_ratio"][2].append((labels, values["hit_rate"]))
+        return families
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        for name, (metric_type, help, samples) in self._cache_metrics().items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram("rag_stage_seconds", "Time spent in each pipeline stage.", ["stage"])
+stage_errors = registry.counter("rag_stage_errors_total", "Pipeline stage failures.", ["stage"])
+stage_items = registry.counter("rag_stage_items_total", "Items (pages, chunks, queries) processed per stage.", ["stage"])
+chain_seconds = registry.histogram("rag_chain_seconds", "Latency of cached chain calls, including parsing.", ["template"])
+chain_cache = registry.counter("rag_chain_cache_total", "Chain calls answered from the LLM cache or the model.", ["template", "result"])
+llm_seconds = registry.histogram("rag_llm_seconds", "Latency of model calls.", ["model"])
+llm_errors = registry.counter("rag_llm_errors_total", "Failed model calls.", ["model"])
+llm_tokens = registry.counter("rag_llm_tokens_total", "Tokens sent to and generated by models.", ["model", "kind"])
+http_seconds = registry.histogram("rag_http_request_seconds", "HTTP request latency.", ["method", "endpoint"])
+http_requests = registry.counter("rag_http_requests_total", "HTTP requests served.", ["method", "endpoint", "status"])
+
+
+# Per-request accounting
+
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+# Worker threads started by a request share its stats through the copied context
+_request_lock = threading.Lock()
+
+def start_request(request_id=None):
+    """Start collecting stage timings and token counts for the current request."""
+    stats = {
+        "request_id": request_id or uuid.uuid4().hex,
+        "start": time.perf_counter(),
+        "stages": {},
+        "tokens": {"prompt": 0, "completion": 0},
+        "llm_calls": 0,
+        "llm_cache_hits": 0,
+    }
+    _request_stats.set(stats)
+    return stats
+
+def finish_request(stats, method, endpoint, status):
+    """Record HTTP metrics for a request and print its structured log line."""
+    elapsed = time.perf_counter() - stats["start"]
+    http_seconds.observe(elapsed, method=method, endpoint=endpoint)
+    http_requests.inc(method=method, endpoint=endpoint, status=str(status))
+    if request_log_enabled:
+        print(json.dumps({
+            "event": "request",
+            "request_id": stats["request_id"],
+            "method": method,
+            "endpoint": endpoint,
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 2),
+            "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in stats["stages"].items()},
+            "tokens": stats["tokens"],
+            "llm_calls": stats["llm_calls"],
+            "llm_cache_hits": stats["llm_cache_hits"],
+        }), flush=True)
+
+
+class StreamedResponseBody:
+    """
+    Response body that finishes its request when it is closed, so the
+    duration and token counts of a streamed request cover the whole stream
+    rather than only producing the headers.
+    """
+
+    def __init__(self, body, stats, method, endpoint, status):
+        self.body = body
+        self.stats = stats
+        self.method = method
+        self.endpoint = endpoint
+        self.status = status
+        self._finished = False
+
+    def __iter__(self):
+        # Tokens generated while the body is sent count toward this request
+        _request_stats.set(self.stats)
+        yield from self.body
+
+    def close(self):
+        try:
+            if hasattr(self.body, "close"):
+                self.body.close()
+        finally:
+            if not self._finished:
+                self._finished = True
+                finish_request(self.stats, self.method, self.endpoint, self.status)
+
+
+def _add_to_request(key, amount, field=None):
+    stats = _request_stats.get()
+    if stats is None:
+        return
+    with _request_lock:
+        if field is None:
+            stats[key] += amount
+        else:
+            stats[key][field] = stats[key].get(field, 0) + amount
+
+
+# Instrumentation helpers
+
+def record_stage(name, seconds, items=None):
+    stage_seconds.observe(seconds, stage=name)
+    if items:
+        stage_items.inc(items, stage=name)
+    _add_to_request("stages", seconds, name)
+
+@contextmanager
+def stage(name, items=None):
+    """Time a block as a pipeline stage, counting failures."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        stage_errors.inc(stage=name)
+        raise
+    finally:
+        record_stage(name, time.perf_counter() - start, items)
+
+def timed_iter(iterable, name):
+    """Yield from an iterable, timing the production of each item as a stage."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        except Exception:
+            stage_errors.inc(stage=name)
+            raise
+        record_stage(name, time.perf_counter() - start, 1)
+        yield item
+
+def record_chain(template_id, seconds, cached):
+    chain_seconds.observe(seconds, template=template_id)
+    chain_cache.inc(template=template_id, result="hit" if cached else "miss")
+    if cached:
+        _add_to_request("llm_cache_hits", 1)
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Records latency, errors and token usage of every call to a model."""
+
+    def __init__(self, model_label):
+        self.model_label = model_label
+        self._starts = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            llm_seconds.observe(time.perf_counter() - start, model=self.model_label)
+        _add_to_request("llm_calls", 1)
+
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+        if not prompt_tokens and not completion_tokens:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+
+        llm_tokens.inc(prompt_tokens, model=self.model_label, kind="prompt")
+        llm_tokens.inc(completion_tokens, model=self.model_label, kind="completion")
+        _add_to_request("tokens", prompt_tokens, "prompt")
+        _add_to_request("tokens", completion_tokens, "completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._starts.pop(run_id, None)
+        llm_errors.inc(model=self.model_label)
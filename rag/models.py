@@ -1,53 +1,132 @@
 import os
+import threading
+from functools import cached_property
+
+import httpx
 from langchain_ollama import OllamaEmbeddings, ChatOllama
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 
+from embedding_cache import CachedEmbeddings
+from metrics import LLMMetricsCallback
+
 load_dotenv()
 
+# Maximum number of connections kept open to each backend
+http_pool_size = int(os.environ.get("HTTP_POOL_SIZE", 20))
+
 class Models:
-    def __init__(self):
-        self.embeddings_model = OllamaEmbeddings(
-            base_url= os.environ.get("OLLAMA_BASE_URL"),
-            model=os.environ.get("OLLAMA_EMBEDDING_MODEL")
-        )
-        
-        self.chat_model = ChatOllama(
-            base_url= os.environ.get("OLLAMA_BASE_URL"),
-            model=os.environ.get("OLLAMA_CHAT_MODEL"),
-            temperature=0.1
-        )
+    """
+    Registry of the LLM and embedding clients used by the app.
 
-        self.summary_model = ChatOllama(
-            base_url= os.environ.get("OLLAMA_BASE_URL"),
-            model=os.environ.get("OLLAMA_SUMMARY_MODEL"),
-            temperature=0
+    Each model is built the first time it is accessed. All Ollama models share
+    one keep-alive connection pool and all DeepSeek models share another, so
+    creating a model does not open new connections. Use get_models() to get the
+    process-wide instance instead of constructing this class directly.
+    """
+
+    def __init__(self, pool_size=None):
+        pool_size = pool_size or http_pool_size
+        self._limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
         )
 
-        self.roadmap_model = ChatOpenAI(
-            base_url=os.environ.get("DEEPSEEK_BASE_URL"),
-            api_key=os.environ.get("DEEPSEEK_API_KEY"),
-            model_name=os.environ.get("DEEPSEEK_MODEL"),
-            temperature=0,
-            )
-        
-        self.quiz_model = ChatOpenAI(
-            base_url=os.environ.get("DEEPSEEK_BASE_URL"),
-            api_key=os.environ.get("DEEPSEEK_API_KEY"),
-            model_name=os.environ.get("DEEPSEEK_MODEL"),
-            temperature=0,
-            )
+    # Connection pools, one per backend
+
+    @cached_property
+    def _ollama_transport(self):
+        return httpx.HTTPTransport(limits=self._limits)
+
+    @cached_property
+    def _ollama_async_transport(self):
+        return httpx.AsyncHTTPTransport(limits=self._limits)
+
+    @cached_property
+    def _deepseek_http_client(self):
+        return httpx.Client(limits=self._limits)
 
-        self.chunk_model = ChatOpenAI(
+    @cached_property
+    def _deepseek_async_http_client(self):
+        return httpx.AsyncClient(limits=self._limits)
+
+    def _ollama_kwargs(self):
+        return {
+            "base_url": os.environ.get("OLLAMA_BASE_URL"),
+            "sync_client_kwargs": {"transport": self._ollama_transport},
+            "async_client_kwargs": {"transport": self._ollama_async_transport},
+        }
+
+    def _deepseek_model(self, label):
+        return ChatOpenAI(
             base_url=os.environ.get("DEEPSEEK_BASE_URL"),
             api_key=os.environ.get("DEEPSEEK_API_KEY"),
             model_name=os.environ.get("DEEPSEEK_MODEL"),
             temperature=0,
+            http_client=self._deepseek_http_client,
+            http_async_client=self._deepseek_async_http_client,
+            # Report token usage for streamed responses too
+            stream_usage=True,
+            callbacks=[LLMMetricsCallback(label)],
             )
 
-        self.transcript_model = ChatOpenAI(
-            base_url=os.environ.get("DEEPSEEK_BASE_URL"),
-            api_key=os.environ.get("DEEPSEEK_API_KEY"),
-            model_name=os.environ.get("DEEPSEEK_MODEL"),
+    # Ollama models
+
+    @cached_property
+    def embeddings_model(self):
+        model_name = os.environ.get("OLLAMA_EMBEDDING_MODEL")
+        embeddings = OllamaEmbeddings(
+            model=model_name,
+            **self._ollama_kwargs()
+        )
+        # Persist embeddings so the same text is never embedded twice
+        return CachedEmbeddings(embeddings, namespace=model_name)
+
+    @cached_property
+    def chat_model(self):
+        return ChatOllama(
+            model=os.environ.get("OLLAMA_CHAT_MODEL"),
+            temperature=0.1,
+            callbacks=[LLMMetricsCallback("chat")],
+            **self._ollama_kwargs()
+        )
+
+    @cached_property
+    def summary_model(self):
+        return ChatOllama(
+            model=os.environ.get("OLLAMA_SUMMARY_MODEL"),
             temperature=0,
-            )
\ No newline at end of file
+            callbacks=[LLMMetricsCallback("summary")],
+            **self._ollama_kwargs()
+        )
+
+    # DeepSeek models
+
+    @cached_property
+    def roadmap_model(self):
+        return self._deepseek_model("roadmap")
+
+    @cached_property
+    def quiz_model(self):
+        return self._deepseek_model("quiz")
+
+    @cached_property
+    def chunk_model(self):
+        return self._deepseek_model("chunk")
+
+    @cached_property
+    def transcript_model(self):
+        return self._deepseek_model("transcript")
+
+
+_models = None
+_models_lock = threading.Lock()
+
+def get_models():
+    """Return the process-wide Models registry, creating it on first use."""
+    global _models
+    if _models is None:
+        with _models_lock:
+            if _models is None:
+                _models = Models()
+    return _models
@@ -0,0 +1,384 @@
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+load_dotenv()
+
+# Constants
+numpy_store_directory = "./db/numpy_vectors"
+# Embedding storage precision: "float16", or "int8" with a scale per row
+numpy_store_dtype = os.environ.get("NUMPY_VECTOR_DTYPE", "float16")
+# Rows converted to float32 at a time while scoring
+score_block_rows = 8192
+# A segment is merged into the one before it once it holds at least this
+# fraction of that segment's rows, which keeps O(log n) segments
+segment_merge_ratio = 0.5
+# Attempts to read a consistent manifest while another process merges segments
+load_attempts = 5
+
+
+def _matches(metadata, where):
+    """Evaluate the subset of Chroma `where` filters the project uses."""
+    for field, condition in where.items():
+        if field == "$and":
+            if not all(_matches(metadata, clause) for clause in condition):
+                return False
+            continue
+        value = metadata.get(field)
+        if isinstance(condition, dict):
+            for operator, operand in condition.items():
+                if operator == "$eq" and value != operand:
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$nin" and value in operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class _Segment:
+    """
+    An immutable batch of rows plus the IDs it deletes from earlier segments.
+
+    Rows are stored as a memory-mapped .npy matrix (and row scales for int8)
+    next to a JSON file with their IDs, texts and metadata.
+    """
+
+    def __init__(self, name, ids, documents, metadatas, deleted, embeddings, scales):
+        self.name = name
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.deleted = deleted
+        self.embeddings = embeddings
+        self.scales = scales
+
+    @property
+    def weight(self):
+        return len(self.ids) + len(self.deleted)
+
+    def files(self):
+        return [f"{self.name}.json", f"{self.name}.npy", f"{self.name}-scales.npy"]
+
+    @classmethod
+    def load(cls, directory, name):
+        with open(os.path.join(directory, f"{name}.json")) as f:
+            data = json.load(f)
+        embeddings = scales = None
+        if data["ids"]:
+            embeddings = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            if data["has_scales"]:
+                scales = np.load(os.path.join(directory, f"{name}-scales.npy"), mmap_mode="r")
+        return cls(name, data["ids"], data["documents"], data["metadatas"], data["deleted"], embeddings, scales)
+
+    @classmethod
+    def write(cls, directory, ids, documents, metadatas, deleted, embeddings, scales):
+        name = f"segment-{uuid.uuid4().hex}"
+        if ids:
+            np.save(os.path.join(directory, f"{name}.npy"), embeddings)
+            if scales is not None:
+                np.save(os.path.join(directory, f"{name}-scales.npy"), scales)
+        data = {
+            "ids": ids,
+            "documents": documents,
+            "metadatas": metadatas,
+            "deleted": deleted,
+            "has_scales": scales is not None,
+        }
+        with open(os.path.join(directory, f"{name}.json"), "w") as f:
+            json.dump(data, f)
+        return cls.load(directory, name)
+
+
+class _Snapshot:
+    """
+    A view of a collection's segments in order.
+
+    Each segment first deletes its `deleted` IDs from the segments before it,
+    then adds its rows, replacing earlier rows with the same ID.
+    """
+
+    def __init__(self, segments=(), dtype=None, dim=None, stamp=None):
+        self.segments = list(segments)
+        self.dtype = dtype
+        self.dim = dim
+        self.stamp = stamp
+        self.locations = {}
+        for index, segment in enumerate(self.segments):
+            for chunk_id in segment.deleted:
+                self.locations.pop(chunk_id, None)
+            for row, chunk_id in enumerate(segment.ids):
+                self.locations.pop(chunk_id, None)
+                self.locations[chunk_id] = (index, row)
+        self.live = [np.zeros(len(segment.ids), dtype=bool) for segment in self.segments]
+        for index, row in self.locations.values():
+            self.live[index][row] = True
+
+    def document(self, location):
+        index, row = location
+        return self.segments[index].documents[row]
+
+    def metadata(self, location):
+        index, row = location
+        return self.segments[index].metadatas[row]
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Vector store backed by memory-mapped NumPy matrices per collection.
+
+    Embeddings are normalized and stored as float16, or as int8 with a scale
+    per row, in .npy files that are memory-mapped on open. Search is an
+    exact top-k by dot product, scored as cosine distance so that lower is
+    better, like Chroma.
+
+    Every write appends an immutable segment holding only its own rows and
+    the IDs it deletes, then swaps in a small manifest listing the segments,
+    so an ingest writes each row a logarithmic number of times: trailing
+    segments are merged once they grow close to the size of the one before
+    them. Writers take a file lock on the collection, and readers reload the
+    manifest whenever it changes on disk, so handles in other threads and
+    processes see each other's writes. Implements the parts of the Chroma
+    API the project uses: add_documents, get, delete and
+    similarity_search(_with_score).
+    """
+
+    def __init__(self, collection_name, embedding_function, persist_directory=numpy_store_directory, dtype=numpy_store_dtype):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported embedding dtype: {dtype}")
+        self.collection_name = collection_name
+        self.embedding_function = embedding_function
+        self.directory = os.path.join(persist_directory, collection_name)
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        self._snapshot = _Snapshot()
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    # Storage
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, "manifest.json")
+
+    def _manifest_stamp(self):
+        try:
+            stat = os.stat(self._manifest_path())
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self):
+        """Return the current snapshot, reloading it if the manifest changed on disk."""
+        for _ in range(load_attempts):
+            stamp = self._manifest_stamp()
+            snapshot = self._snapshot
+            if stamp == snapshot.stamp:
+                return snapshot
+            if stamp is None:
+                self._snapshot = _Snapshot()
+                return self._snapshot
+            try:
+                with open(self._manifest_path()) as f:
+                    manifest = json.load(f)
+                # Segments are immutable, so ones already loaded are reused
+                loaded = {segment.name: segment for segment in snapshot.segments}
+                segments = [loaded.get(name) or _Segment.load(self.directory, name) for name in manifest["segments"]]
+            except FileNotFoundError:
+                # A merge replaced the manifest and removed its segments; read it again
+                continue
+            # An existing collection keeps the precision it was created with
+            self.dtype = manifest["dtype"]
+            self._snapshot = _Snapshot(segments, manifest["dtype"], manifest["dim"], stamp)
+            return self._snapshot
+        raise RuntimeError(f"Could not load a consistent snapshot of {self.collection_name}")
+
+    @contextmanager
+    def _write_lock(self):
+        """Serialize writers across threads and, where fcntl exists, processes."""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, "write.lock"), "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield self._refresh()
+
+    def _encode(self, vectors):
+        """Normalize float32 rows and convert them to the storage dtype."""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        if self.dtype == "float16":
+            return vectors.astype(np.float16), None
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales = np.where(scales == 0, 1, scales).astype(np.float32)
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales
+
+    def _merge(self, first, second, is_base):
+        """Write one segment equivalent to `first` followed by `second`."""
+        replaced = set(second.ids) | set(second.deleted)
+        keep = [row for row, chunk_id in enumerate(first.ids) if chunk_id not in replaced]
+        ids = [first.ids[row] for row in keep] + second.ids
+        documents = [first.documents[row] for row in keep] + second.documents
+        metadatas = [first.metadatas[row] for row in keep] + second.metadatas
+        # The first segment has nothing before it to delete from
+        deleted = [] if is_base else sorted(set(first.deleted) | set(second.deleted))
+
+        parts = [np.asarray(segment.embeddings[rows]) for segment, rows in ((first, keep), (second, slice(None))) if segment.ids]
+        scale_parts = [np.asarray(segment.scales[rows]) for segment, rows in ((first, keep), (second, slice(None))) if segment.scales is not None]
+        embeddings = np.concatenate(parts) if parts else None
+        scales = np.concatenate(scale_parts) if scale_parts else None
+        return _Segment.write(self.directory, ids, documents, metadatas, deleted, embeddings, scales)
+
+    def _commit(self, snapshot, segment, dim):
+        """Append a segment, merge trailing segments and swap in the new manifest."""
+        segments = snapshot.segments + [segment]
+        while len(segments) > 1 and segments[-1].weight >= segment_merge_ratio * segments[-2].weight:
+            second, first = segments.pop(), segments.pop()
+            segments.append(self._merge(first, second, is_base=not segments))
+
+        manifest = {"dtype": self.dtype, "dim": dim, "segments": [segment.name for segment in segments]}
+        temp_path = self._manifest_path() + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, self._manifest_path())
+
+        # Remove merged segments; open memory maps stay valid
+        live = {name for segment in segments for name in segment.files()} | {"manifest.json", "write.lock"}
+        for name in os.listdir(self.directory):
+            if name not in live:
+                os.remove(os.path.join(self.directory, name))
+        self._snapshot = _Snapshot(segments, self.dtype, dim, self._manifest_stamp())
+
+    # VectorStore API
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        """Embed and upsert texts, replacing any rows with the same IDs."""
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        vectors = np.asarray(self.embedding_function.embed_documents(texts), dtype=np.float32)
+
+        with self._write_lock() as snapshot:
+            if snapshot.dim is not None and snapshot.dim != vectors.shape[1]:
+                raise ValueError("Embedding dimension does not match the collection")
+            embeddings, scales = self._encode(vectors)
+            segment = _Segment.write(self.directory, ids, texts, metadatas, [], embeddings, scales)
+            self._commit(snapshot, segment, vectors.shape[1])
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        """Delete rows by ID."""
+        if not ids:
+            return
+        with self._write_lock() as snapshot:
+            deleted = [chunk_id for chunk_id in ids if chunk_id in snapshot.locations]
+            if deleted:
+                segment = _Segment.write(self.directory, [], [], [], deleted, None, None)
+                self._commit(snapshot, segment, snapshot.dim)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("metadatas", "documents")):
+        """Return stored rows in Chroma's get() result format."""
+        snapshot = self._refresh()
+        if ids is not None:
+            chunk_ids = [chunk_id for chunk_id in ids if chunk_id in snapshot.locations]
+        else:
+            chunk_ids = list(snapshot.locations)
+        if where:
+            chunk_ids = [chunk_id for chunk_id in chunk_ids if _matches(snapshot.metadata(snapshot.locations[chunk_id]), where)]
+        chunk_ids = chunk_ids[offset or 0:]
+        if limit is not None:
+            chunk_ids = chunk_ids[:limit]
+
+        locations = [snapshot.locations[chunk_id] for chunk_id in chunk_ids]
+        result = {"ids": chunk_ids, "metadatas": None, "documents": None, "embeddings": None}
+        if "metadatas" in include:
+            result["metadatas"] = [snapshot.metadata(location) for location in locations]
+        if "documents" in include:
+            result["documents"] = [snapshot.document(location) for location in locations]
+        if "embeddings" in include:
+            result["embeddings"] = [self._decode(snapshot.segments[index], [row])[0] for index, row in locations]
+        return result
+
+    @staticmethod
+    def _decode(segment, rows):
+        vectors = np.asarray(segment.embeddings[rows], dtype=np.float32)
+        if segment.scales is not None:
+            vectors *= np.asarray(segment.scales[rows])[:, None]
+        return vectors
+
+    @staticmethod
+    def _scores(segment, query_vector):
+        """Cosine similarity of every row of a segment to a normalized query, block by block."""
+        scores = np.empty(len(segment.ids), dtype=np.float32)
+        for start in range(0, len(scores), score_block_rows):
+            block = np.asarray(segment.embeddings[start:start + score_block_rows], dtype=np.float32)
+            scores[start:start + len(block)] = block @ query_vector
+        if segment.scales is not None:
+            scores *= segment.scales
+        return scores
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None):
+        snapshot = self._refresh()
+        query_vector = np.asarray(embedding, dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) or 1
+
+        # Take each segment's top k, then the best k of those
+        candidates = []
+        for index, (segment, live) in enumerate(zip(snapshot.segments, snapshot.live)):
+            if not live.any():
+                continue
+            scores = self._scores(segment, query_vector)
+            scores[~live] = -np.inf
+            if filter:
+                mask = np.array([live[row] and _matches(segment.metadatas[row], filter) for row in range(len(scores))])
+                scores[~mask] = -np.inf
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            candidates.extend((float(scores[row]), index, int(row)) for row in top if scores[row] != -np.inf)
+
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        return [
+            (Document(page_content=snapshot.document((index, row)), metadata=snapshot.metadata((index, row))), 1 - score)
+            for score, index, row in candidates[:k]
+        ]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        embedding = self.embedding_function.embed_query(query)
+        return self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [document for document, _ in self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)]
+
+    def delete_collection(self):
+        """Delete the collection's files."""
+        with self._lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self._snapshot = _Snapshot()
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, collection_name="documents", **kwargs):
+        store = cls(collection_name, embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
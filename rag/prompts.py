@@ -191,6 +191,40 @@ Additional Guidelines:
 - Personalize the roadmap based on user’s learning preferences.  
 """)
 
+ROADMAP_MERGE_TEMPLATE = PromptTemplate.from_template(
+      template="""You are an AI roadmap generator that merges partial study roadmaps into one roadmap for a whole document.
+
+Purpose:  
+The document was too large to analyze at once, so it was split into consecutive sections (in page order) and a partial roadmap was generated for each section. Your task is to combine these partial roadmaps into a single structured study roadmap.  
+
+Instructions:
+
+1. Merging the Partial Roadmaps
+- The input is a JSON list of partial roadmaps, in the order the sections appear in the document.  
+- Merge nodes from different sections that cover the same or closely related concepts into a single node.  
+- When merging nodes, combine their related chunks, write one summary covering both, and keep the higher difficulty level.  
+- Keep nodes that are unique to one section unless they are minor details.  
+
+2. Structuring the Roadmap
+- The roadmap should contain 8-15 key learning topics (nodes).  
+- Each node must keep the same fields as the partial roadmaps: node_id, topic, related_chunks, summary, difficulty and estimated_time.  
+- Number the nodes sequentially starting from 1 in the order they should be studied.  
+- Only use chunk IDs that appear in the partial roadmaps, in "page_number:chunk_number_in_that_page" format.  
+
+{format_instructions}
+
+
+Here are the partial roadmaps:
+
+{text}
+
+
+Additional Guidelines:
+- Ensure logical learning flow (start with fundamentals, progress to advanced topics).  
+- Do NOT exceed 15 roadmap nodes (keep it structured and useful).  
+- Always output a valid JSON format (for easy parsing).  
+""")
+
 QUIZ_TEMPLATE = PromptTemplate.from_template(
     """You are an AI quiz generator that creates well-structured, concept-reinforcing multiple-choice quizzes based on a given topic. Your goal is to generate a quiz covering all aspects of the topic using the provided content from related chunks. The quiz should assess understanding holistically.
 
@@ -5,17 +5,19 @@ from typing import List
 from pydantic import BaseModel, Field
 
 #Load Environment Variables
+import asyncio
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
 #Local Imports
-from ingest import return_chunk_by_id, initialize_vector_store
+from ingest import return_chunks_by_ids, initialize_vector_store
 from prompts import QUIZ_TEMPLATE
-from models import Models
+from models import get_models
+from llm_cache import cached_llm
 
 #Initialize the Models
-model = Models()
+model = get_models()
 quiz_model = model.quiz_model
 
 #Quiz Models
@@ -43,7 +45,7 @@ prompt = QUIZ_TEMPLATE.partial(
     format_instructions=parser.get_format_instructions()
 )
 
-chain = prompt | quiz_model | parser
+chain = prompt | cached_llm(quiz_model, "quiz", parser)
 
 def format_related_chunks(node, vector_store):
     node_topic = node["topic"]
@@ -51,8 +53,9 @@ def format_related_chunks(node, vector_store):
     
     formatted_text = f"Topic: {node_topic}\n---\n"
     
+    chunks = return_chunks_by_ids(related_chunks, vector_store)
     for chunk_id in related_chunks:
-        chunk = return_chunk_by_id(chunk_id, vector_store)
+        chunk = chunks.get(chunk_id)
         if chunk:
             formatted_text += f"Chunk ID: {chunk_id}\n"
             formatted_text += f"Content: {chunk['content']}\n"
@@ -69,6 +72,17 @@ def create_quiz(node, filename):
         print(f"Error creating quiz: {e}")
         return None
 
+async def acreate_quiz(node, filename):
+    """Async version of create_quiz; vector store reads run in a worker thread."""
+    vector_store = await asyncio.to_thread(initialize_vector_store, collection_name=filename)
+    formatted_text = await asyncio.to_thread(format_related_chunks, node, vector_store)
+    try:
+        quiz = await chain.ainvoke({"text" : formatted_text})
+        return quiz.model_dump()
+    except Exception as e:
+        print(f"Error creating quiz: {e}")
+        return None
+
 if __name__ == "__main__":
     node = {
     "node_id": 1,
@@ -0,0 +1,93 @@
+import os
+from typing import Any, List
+
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from ingest import return_chunks_by_ids
+from lexical_index import lexical_index
+from metrics import stage
+
+load_dotenv()
+
+# Constants
+retrieval_mode = os.environ.get("RETRIEVAL_MODE", "hybrid")
+retrieval_k = int(os.environ.get("RETRIEVAL_K", 4))
+# Candidates taken from each retriever before fusion
+retrieval_fetch_k = int(os.environ.get("RETRIEVAL_FETCH_K", 20))
+# Reciprocal rank fusion constant; larger values flatten the rank weights
+rrf_k = 60
+
+retrieval_modes = ("hybrid", "vector", "lexical")
+
+
+def reciprocal_rank_fusion(rankings, k=rrf_k):
+    """
+    Fuse several ranked lists of IDs into one.
+
+    Each ID scores the sum of 1 / (k + rank) over the lists it appears in.
+
+    Returns:
+        list[str]: IDs ordered by fused score, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retrieves chunks from a collection by BM25, by vector similarity, or both.
+
+    In "hybrid" mode the lexical and vector rankings are combined with
+    reciprocal rank fusion, so exact terms like section numbers are found
+    even when their embeddings are not close to the query. "lexical" mode
+    makes no embedding call at all, and "vector" mode matches the plain
+    vector store retriever.
+    """
+
+    vector_store: Any
+    collection_name: str
+    mode: str = retrieval_mode
+    k: int = retrieval_k
+    fetch_k: int = retrieval_fetch_k
+
+    def _ensure_indexed(self):
+        # Collections ingested before the lexical index existed are indexed on first use
+        if lexical_index.count(self.collection_name):
+            return
+        chunks = self.vector_store.get(include=["metadatas", "documents"])
+        lexical_index.index(self.collection_name, [
+            Document(page_content=content, metadata=metadata)
+            for metadata, content in zip(chunks['metadatas'], chunks['documents'])
+            if metadata.get('chunk_id')
+        ])
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        if self.mode not in retrieval_modes:
+            raise ValueError(f"Unknown retrieval mode: {self.mode}")
+
+        if self.mode == "vector":
+            with stage("retrieval_vector"):
+                return self.vector_store.similarity_search(query, k=self.k)
+
+        self._ensure_indexed()
+        with stage("retrieval_lexical"):
+            lexical_ids = [chunk_id for chunk_id, _ in lexical_index.search(self.collection_name, query, k=self.fetch_k)]
+        if self.mode == "lexical":
+            ranked_ids = lexical_ids[:self.k]
+            documents = {}
+        else:
+            with stage("retrieval_vector"):
+                vector_docs = self.vector_store.similarity_search(query, k=self.fetch_k)
+            documents = {document.metadata.get('chunk_id'): document for document in vector_docs}
+            ranked_ids = reciprocal_rank_fusion([lexical_ids, list(documents)])[:self.k]
+
+        # Chunks found only lexically are fetched by ID, which needs no embedding
+        missing = [chunk_id for chunk_id in ranked_ids if chunk_id not in documents]
+        for chunk_id, chunk in return_chunks_by_ids(missing, self.vector_store).items():
+            documents[chunk_id] = Document(page_content=chunk['content'], metadata=chunk['metadata'])
+        return [documents[chunk_id] for chunk_id in ranked_ids if chunk_id in documents]
@@ -6,19 +6,26 @@ from pydantic import BaseModel, Field
 
 
 #Load Environment Variables
+import asyncio
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
 #Local Imports
-from ingest import condensed_metadata, initialize_vector_store
-from prompts import ROADMAP_TEMPLATE
-from models import Models
+from ingest import condensed_metadata, build_condensed_metadata, estimate_tokens, initialize_vector_store, return_documents_summary
+from prompts import ROADMAP_TEMPLATE, ROADMAP_MERGE_TEMPLATE
+from models import get_models
+from llm_cache import cached_llm
 
 #Initialize the Models
-model = Models()
+model = get_models()
 roadmap_model = model.roadmap_model
 
+# Map-reduce settings for documents too large for a single prompt
+roadmap_token_threshold = int(os.environ.get("ROADMAP_TOKEN_THRESHOLD", 24000))
+roadmap_section_tokens = int(os.environ.get("ROADMAP_SECTION_TOKENS", 12000))
+roadmap_map_workers = int(os.environ.get("ROADMAP_MAP_WORKERS", 4))
+
 #Roadmap Models
 class RoadmapNode(BaseModel):
     """
@@ -44,13 +51,124 @@ prompt = ROADMAP_TEMPLATE.partial(
     format_instructions=parser.get_format_instructions()
 )
 
-chain = prompt | roadmap_model | parser
+chain = prompt | cached_llm(roadmap_model, "roadmap", parser)
+
+merge_prompt = ROADMAP_MERGE_TEMPLATE.partial(
+    format_instructions=parser.get_format_instructions()
+)
+
+merge_chain = merge_prompt | cached_llm(roadmap_model, "roadmap_merge", parser)
+
+def split_sections(metadata, max_tokens):
+    """Group page-ordered chunk metadata into consecutive sections under a token budget."""
+    sections = []
+    section = []
+    section_tokens = 0
+    for data in metadata:
+        _, tokens = build_condensed_metadata([data])
+        if section and section_tokens + tokens > max_tokens:
+            sections.append(section)
+            section = []
+            section_tokens = 0
+        section.append(data)
+        section_tokens += tokens
+    if section:
+        sections.append(section)
+    return sections
+
+def group_for_merge(roadmaps):
+    """
+    Split roadmaps into consecutive groups whose combined JSON stays under the
+    token threshold. Groups of one roadmap need no merging.
+    """
+    groups = []
+    group = []
+    group_tokens = 0
+    for roadmap in roadmaps:
+        tokens = estimate_tokens(roadmap.model_dump_json())
+        if len(group) > 1 and group_tokens + tokens > roadmap_token_threshold:
+            groups.append(group)
+            group = []
+            group_tokens = 0
+        group.append(roadmap)
+        group_tokens += tokens
+    groups.append(group)
+    return groups
+
+def merge_inputs(groups):
+    """Build merge_chain inputs for the groups that hold more than one roadmap."""
+    return [
+        {"text": "[" + ",\n".join(roadmap.model_dump_json() for roadmap in group) + "]"}
+        for group in groups if len(group) > 1
+    ]
+
+def merge_roadmaps(roadmaps):
+    """
+    Merge partial roadmaps into one. Groups whose combined JSON would exceed
+    the token threshold are merged first, level by level, until one remains.
+    """
+    while len(roadmaps) > 1:
+        groups = group_for_merge(roadmaps)
+        merged = iter(merge_chain.batch(merge_inputs(groups), config={"max_concurrency": roadmap_map_workers}))
+        roadmaps = [next(merged) if len(group) > 1 else group[0] for group in groups]
+    return roadmaps[0]
+
+async def amerge_roadmaps(roadmaps):
+    """Async version of merge_roadmaps."""
+    while len(roadmaps) > 1:
+        groups = group_for_merge(roadmaps)
+        merged = iter(await merge_chain.abatch(merge_inputs(groups), config={"max_concurrency": roadmap_map_workers}))
+        roadmaps = [next(merged) if len(group) > 1 else group[0] for group in groups]
+    return roadmaps[0]
+
+def section_inputs(metadata):
+    """Build chain inputs for consecutive page ranges of a large document."""
+    sections = split_sections(metadata, roadmap_section_tokens)
+    return [{"text": build_condensed_metadata(section, roadmap_section_tokens)[0]} for section in sections]
+
+def renumber_nodes(roadmap):
+    """Renumber nodes merged from different sections, whose IDs may collide."""
+    for node_id, node in enumerate(roadmap.roadmap, start=1):
+        node.node_id = node_id
+    return roadmap
+
+def create_roadmap_map_reduce(metadata):
+    """
+    Build a roadmap for a large document by generating partial roadmaps for
+    consecutive page ranges in parallel and merging them.
+    """
+    partial_roadmaps = chain.batch(section_inputs(metadata), config={"max_concurrency": roadmap_map_workers})
+    return renumber_nodes(merge_roadmaps(partial_roadmaps))
+
+async def acreate_roadmap_map_reduce(metadata):
+    """Async version of create_roadmap_map_reduce."""
+    partial_roadmaps = await chain.abatch(section_inputs(metadata), config={"max_concurrency": roadmap_map_workers})
+    return renumber_nodes(await amerge_roadmaps(partial_roadmaps))
 
 def create_roadmap(filename):
     try:
         vector_store = initialize_vector_store(collection_name=filename)
-        condensed_metadata_text = condensed_metadata(vector_store=vector_store)
-        roadmap = chain.invoke({"text" : condensed_metadata_text})
+        metadata = return_documents_summary(vector_store=vector_store)
+        condensed_metadata_text, token_count = build_condensed_metadata(metadata)
+        if token_count > roadmap_token_threshold:
+            roadmap = create_roadmap_map_reduce(metadata)
+        else:
+            roadmap = chain.invoke({"text" : condensed_metadata_text})
+        return roadmap.model_dump()
+    except Exception as e:
+        print(f"Error creating roadmap: {e}")
+        return None
+
+async def acreate_roadmap(filename):
+    """Async version of create_roadmap; vector store reads run in a worker thread."""
+    try:
+        vector_store = await asyncio.to_thread(initialize_vector_store, collection_name=filename)
+        metadata = await asyncio.to_thread(return_documents_summary, vector_store=vector_store)
+        condensed_metadata_text, token_count = build_condensed_metadata(metadata)
+        if token_count > roadmap_token_threshold:
+            roadmap = await acreate_roadmap_map_reduce(metadata)
+        else:
+            roadmap = await chain.ainvoke({"text" : condensed_metadata_text})
         return roadmap.model_dump()
     except Exception as e:
         print(f"Error creating roadmap: {e}")
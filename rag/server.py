@@ -1,22 +1,53 @@
-from flask import Flask, request, jsonify, Response, session, make_response
+from flask import Flask, request, jsonify, Response, session, make_response, stream_with_context, g
 from werkzeug.utils import secure_filename
+import atexit
+import hashlib
 import os
-import json
 import uuid
 from flask_cors import CORS
 from flask import request, jsonify
 from db_manager import DBManager
 
 #Local Imports
-from ingest import condensed_metadata, initialize_vector_store, ingest_file, return_chunk_by_id, return_documents_summary, search_documents_with_score
-from quiz import create_quiz
 from roadmap import create_roadmap
-from chat_with_chunk import chat_with_chunk
-from chat import chat_with_docs
+from chat_with_chunk import chat_with_chunk, stream_chat_with_chunk
+from chat import chat_with_docs, stream_chat_with_docs
+from retrieval import retrieval_modes
+from streaming import sse_stream
+from vector_stores import close_vector_stores, delete_vector_store
+from jobs import IngestJobQueue, QuizPregenerator
+from single_flight import SingleFlight
+from llm_cache import llm_cache
+from answer_cache import answer_cache
+from models import get_models
+import metrics
 
 # Initialize database manager
 db_manager = DBManager()
 
+# Initialize background ingestion and resume jobs interrupted by a restart.
+# The debug reloader's watcher process also runs this module, so only the
+# process actually serving requests resumes jobs.
+ingest_queue = IngestJobQueue(db_manager)
+if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    ingest_queue.resume_unfinished()
+
+# Share roadmap and quiz generation between concurrent requests and workers
+single_flight = SingleFlight(db_manager)
+
+# Generate quizzes for new roadmaps in the background
+quiz_pregenerator = QuizPregenerator(db_manager, single_flight)
+
+# Export cache hit rates on /metrics
+metrics.registry.register_cache("llm", llm_cache.stats)
+metrics.registry.register_cache("answer", answer_cache.stats)
+metrics.registry.register_cache("roadmap_quiz", db_manager.cache_stats)
+metrics.registry.register_cache("embedding_query", lambda: get_models().embeddings_model.stats())
+
+# Stop ingestion workers and close cached vector store handles on shutdown
+atexit.register(close_vector_stores)
+atexit.register(ingest_queue.shutdown)
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key')  # Set a secret key for sessions
 CORS(app, supports_credentials=True)
@@ -31,10 +62,55 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+@app.before_request
+def start_request_metrics():
+    g.request_metrics = metrics.start_request(request.headers.get('X-Request-ID'))
+
+@app.after_request
+def finish_request_metrics(response):
+    # Label by route pattern so /ingest/<job_id> is one endpoint
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    stats = g.request_metrics
+    if response.is_streamed:
+        # A streamed body is only generated after this hook returns
+        response.response = metrics.StreamedResponseBody(
+            response.response, stats, request.method, endpoint, response.status_code
+        )
+    else:
+        metrics.finish_request(stats, request.method, endpoint, response.status_code)
+    response.headers['X-Request-ID'] = stats["request_id"]
+    return response
+
 @app.route("/", methods=['GET'])
 def hello():
     return "Hello World!"
 
+@app.route("/metrics", methods=['GET'])
+def metrics_endpoint():
+    """Expose metrics in the Prometheus text format."""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+def file_sha256(file):
+    """Hash a file path or binary stream, leaving streams rewound."""
+    if isinstance(file, str):
+        with open(file, 'rb') as f:
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+    digest = hashlib.file_digest(file, 'sha256').hexdigest()
+    file.seek(0)
+    return digest
+
+def json_response(json_bytes):
+    """Send already-encoded JSON without decoding and re-encoding it."""
+    return Response(json_bytes, mimetype='application/json')
+
+def event_stream_response(tokens):
+    """Send a token generator to the client as Server-Sent Events."""
+    return Response(
+        stream_with_context(sse_stream(tokens)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 def sanitize_collection_name(name):
     """Sanitize the collection name to meet Chroma requirements."""
     import re
@@ -52,6 +128,68 @@ def sanitize_collection_name(name):
         sanitized += '0'
     return sanitized
 
+def ingest_job_response(job):
+    """Serialize an ingestion job for the API."""
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "filename": job["filename"],
+        "collection_name": job["collection_name"],
+        "progress": {
+            "pages_parsed": job["pages_parsed"],
+            "chunks_total": job["chunks_total"],
+            "chunks_summarized": job["chunks_summarized"],
+            "chunks_embedded": job["chunks_embedded"],
+        },
+        "error": job["error"],
+    }
+
+def save_upload(file, file_path):
+    """Save an upload atomically, so a failed save never leaves a partial file."""
+    temp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        file.save(temp_path)
+        os.replace(temp_path, file_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def get_upload(filename):
+    """
+    Look up the fingerprint and collection for an uploaded file, registering
+    files uploaded before fingerprinting under their original collection.
+    """
+    upload = db_manager.get_upload(filename)
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if upload is None and os.path.exists(file_path):
+        upload = db_manager.adopt_legacy_upload(filename, file_sha256(file_path), sanitize_collection_name(filename))
+    return upload
+
+def current_document():
+    """Return the upload record for the file selected by the current_file cookie."""
+    current_filename = request.cookies.get('current_file')
+    if not current_filename:
+        return None
+    return get_upload(secure_filename(current_filename))
+
+def document_response(message, filename, file_path, collection_name, job=None, status=200):
+    """Build an /ingest response and set the current file cookies."""
+    body = {
+        "message": message,
+        "filename": filename,
+        "file_path": file_path,
+        "collection_name": collection_name
+    }
+    if job:
+        body.update(ingest_job_response(job))
+    response = make_response(jsonify(body))
+
+    # Set cookie with filename and collection name
+    response.set_cookie('current_file', filename, samesite='Strict', secure=True)
+    response.set_cookie('collection_name', collection_name, samesite='Strict', secure=True)
+
+    return response, status
+
 @app.route('/ingest', methods=['POST'])
 def ingest_file_endpoint():
     # Check if the request contains a file
@@ -71,77 +209,89 @@ def ingest_file_endpoint():
         if 'user_id' not in session:
             session['user_id'] = str(uuid.uuid4())
         
-        # Create user-specific collection name
         filename = secure_filename(file.filename)
-        user_collection = sanitize_collection_name(filename)
-        
-        # Check if file already exists in uploads folder
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if os.path.exists(file_path):
-            # If file exists, return success with existing file info
-            response = make_response(jsonify({
-                "message": "File already exists and has been processed",
-                "filename": filename,
-                "file_path": file_path,
-                "collection_name": user_collection
-            }))
-            
-            # Set cookie with filename and collection name
-            response.set_cookie('current_file', filename, samesite='Strict', secure=True)
-            response.set_cookie('collection_name', user_collection, samesite='Strict', secure=True)
-            
-            return response, 200
-        
+
         try:
-            # Create a vector store with the user-specific collection name
-            vector_store = initialize_vector_store(collection_name=user_collection)
-            
-            # Save the file
-            file.save(file_path)
-            
-            # Ingest the file with the dedicated vector store
-            ingest_file(file_path, vector_store=vector_store)
-            
-            # Create response with cookie
-            response = make_response(jsonify({
-                "message": "File uploaded and ingested successfully",
-                "filename": filename,
-                "file_path": file_path,
-                "collection_name": user_collection
-            }))
-            
-            # Set cookie with filename and collection name
-            response.set_cookie('current_file', filename, samesite='Strict', secure=True)
-            response.set_cookie('collection_name', user_collection, samesite='Strict', secure=True)
-            
-            return response, 200
+            # Files with identical bytes share one collection, whatever their name
+            fingerprint = file_sha256(file.stream)
+            upload = get_upload(filename)
+            if upload is None or upload["fingerprint"] != fingerprint:
+                # Save before registering, so a failed save keeps the old registration
+                save_upload(file, file_path)
+                upload = db_manager.register_upload(filename, fingerprint)
+                if upload["released_collection"]:
+                    delete_vector_store(upload["released_collection"])
+            collection_name = upload["collection_name"]
+
+            # New content stays pending until its job is queued, so it is queued
+            # by the next upload if this request fails before getting that far
+            if upload["ingest_pending"]:
+                job_id = ingest_queue.submit(filename, file_path, collection_name, fingerprint=fingerprint)
+                if job_id:
+                    return document_response(
+                        "File uploaded and queued for ingestion", filename, file_path, collection_name,
+                        ingest_queue.get(job_id), status=202
+                    )
+
+            # Reuse the collection if its content is ingested or being ingested
+            job = db_manager.get_latest_ingest_job(collection_name)
+            if job is None or job["status"] != "failed":
+                if job and job["status"] != "completed":
+                    message = "File is already being processed"
+                else:
+                    message = "File already exists and has been processed"
+                return document_response(message, filename, file_path, collection_name, job)
+
+            # Retry ingestion of content whose last job failed
+            job_id = ingest_queue.submit(filename, file_path, collection_name)
+            return document_response(
+                "File uploaded and queued for ingestion", filename, file_path, collection_name,
+                ingest_queue.get(job_id), status=202
+            )
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     else:
         return jsonify({"error": "File type not allowed"}), 400
 
+@app.route('/ingest/<job_id>', methods=['GET'])
+def ingest_status_endpoint(job_id):
+    job = ingest_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(ingest_job_response(job)), 200
+
 
 
 @app.route('/roadmap', methods=['GET'])
 def get_roadmap():
     # Get the current file from cookie
-    current_filename = request.cookies.get('current_file')
-    if not current_filename:
+    document = current_document()
+    if not document:
         return jsonify({"error": "No file selected"}), 400
 
-    # Try to get roadmap from database first
-    stored_roadmap = db_manager.get_roadmap(current_filename)
+    # Try to get roadmap from database first, sending the stored JSON as is
+    stored_roadmap = db_manager.get_roadmap_json(document["fingerprint"])
     if stored_roadmap:
-        return jsonify(stored_roadmap), 200
+        return json_response(stored_roadmap), 200
+
+    def compute():
+        roadmap = create_roadmap(document["collection_name"])
+        if not roadmap:
+            raise RuntimeError("Failed to create roadmap")
+        # Store the roadmap in database and start generating its quizzes
+        db_manager.store_roadmap(document["fingerprint"], roadmap)
+        quiz_pregenerator.schedule(document["fingerprint"], document["collection_name"], roadmap)
+        return roadmap
 
     try:
-        roadmap = create_roadmap(filename=current_filename)
-        if roadmap:
-            # Store the roadmap in database
-            db_manager.store_roadmap(current_filename, roadmap)
-            return jsonify(roadmap), 200
-        else:
-            return jsonify({"error": "Failed to create roadmap"}), 500
+        # Concurrent requests for the same document share one generation
+        roadmap = single_flight.do(
+            f"roadmap:{document['fingerprint']}",
+            compute,
+            lambda: db_manager.get_roadmap(document["fingerprint"]),
+        )
+        return jsonify(roadmap), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -149,8 +299,8 @@ def get_roadmap():
 def get_quiz():
     # Get the current file from cookie
     print("Creating Quiz...")
-    current_filename = request.cookies.get('current_file')
-    if not current_filename:
+    document = current_document()
+    if not document:
         return jsonify({"error": "No file selected"}), 400
 
     # Get the node data from request body
@@ -162,18 +312,18 @@ def get_quiz():
 
     try:
         # Try to get quiz from database first
-        stored_quiz = db_manager.get_quiz(current_filename, node_data['node_id'])
+        stored_quiz = db_manager.get_quiz_json(document["fingerprint"], node_data['node_id'])
         if stored_quiz:
-            return jsonify(stored_quiz), 200
-
-        # If not in database, create new quiz
-        quiz = create_quiz(node_data, current_filename)
-        if quiz:
-            # Store the quiz in database
-            db_manager.store_quiz(current_filename, node_data['node_id'], quiz)
-            return jsonify(quiz), 200
+            return json_response(stored_quiz), 200
+
+        # Wait for a background job already generating this quiz, otherwise
+        # generate it, sharing the work with any concurrent requests
+        future = quiz_pregenerator.in_flight(document["fingerprint"], document["collection_name"], node_data)
+        if future:
+            quiz = future.result()
         else:
-            return jsonify({"error": "Failed to create quiz"}), 500
+            quiz = quiz_pregenerator.generate(document["fingerprint"], document["collection_name"], node_data)
+        return jsonify(quiz), 200
     except Exception as e:
         print(e)
         return jsonify({"error": str(e)}), 500
@@ -181,8 +331,8 @@ def get_quiz():
 @app.route('/chat-with-chunk', methods=['POST'])
 def chat_endpoint():
     # Get the current file from cookie
-    current_filename = request.cookies.get('current_file')
-    if not current_filename:
+    document = current_document()
+    if not document:
         return jsonify({"error": "No file selected"}), 400
 
     # Get the request data
@@ -200,9 +350,13 @@ def chat_endpoint():
     if not user_query:
         return jsonify({"error": "No query provided"}), 400
 
+    # Stream tokens as Server-Sent Events if requested
+    if data.get('stream'):
+        return event_stream_response(stream_chat_with_chunk(user_query, node_data, document["collection_name"]))
+
     try:
         # Call the chat function from chat_with_chunk
-        response = chat_with_chunk(user_query, node_data, current_filename)
+        response = chat_with_chunk(user_query, node_data, document["collection_name"])
         return jsonify({"response": response}), 200
     except Exception as e:
         print(e)
@@ -211,8 +365,8 @@ def chat_endpoint():
 @app.route('/chat', methods=['POST'])
 def global_chat_endpoint():
     # Get the current file from cookie
-    current_filename = request.cookies.get('current_file')
-    if not current_filename:
+    document = current_document()
+    if not document:
         return jsonify({"error": "No file selected"}), 400
 
     # Get the request data
@@ -225,9 +379,17 @@ def global_chat_endpoint():
     if not user_query:
         return jsonify({"error": "No query provided"}), 400
 
+    mode = data.get('mode')
+    if mode is not None and mode not in retrieval_modes:
+        return jsonify({"error": f"Unknown retrieval mode: {mode}"}), 400
+
+    # Stream tokens as Server-Sent Events if requested
+    if data.get('stream'):
+        return event_stream_response(stream_chat_with_docs(user_query, collection_name=document["collection_name"], mode=mode))
+
     try:
         # Call the chat function from chat module
-        response = chat_with_docs(user_query, collection_name=current_filename)
+        response = chat_with_docs(user_query, collection_name=document["collection_name"], mode=mode)
         print(response)
         return jsonify({"response": response}), 200
     except Exception as e:
@@ -0,0 +1,174 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Constants
+lease_seconds = int(os.environ.get("SINGLE_FLIGHT_LEASE_SECONDS", 120))
+poll_interval = float(os.environ.get("SINGLE_FLIGHT_POLL_SECONDS", 0.5))
+
+
+class SingleFlightError(Exception):
+    """Raised in waiters when the shared computation failed in another process."""
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent computations of the same key.
+
+    Within a process, callers of do() for a key that is already being computed
+    wait on the same Future and share its result or error. Across processes
+    (e.g. several gunicorn workers), the computing process holds a lease row
+    in DBManager. Other processes poll for the stored result until the lease
+    is released, fails, or expires because its holder died.
+    """
+
+    def __init__(self, db_manager, lease_seconds=lease_seconds, poll_interval=poll_interval):
+        self.db_manager = db_manager
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, compute, load):
+        """
+        Return the result for a key, computing it at most once at a time.
+
+        Args:
+            key (str): Identifies the computation.
+            compute (callable): Computes, stores and returns the result.
+            load (callable): Returns the stored result, or None if not stored.
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._do_across_processes(key, compute, load)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    async def ado(self, key, compute, load):
+        """
+        Async version of do() for callers on an event loop.
+
+        In-process coalescing is shared with do(), so a key being computed by
+        a thread is awaited rather than computed again, and vice versa. Lease
+        and load calls block on SQLite, so they run in worker threads and a
+        contended lease never stalls the event loop.
+
+        Args:
+            key (str): Identifies the computation.
+            compute (callable): Coroutine function that computes, stores and returns the result.
+            load (callable): Returns the stored result, or None if not stored.
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        try:
+            result = await self._ado_across_processes(key, compute, load)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            # Also release waiters if the leading request is cancelled
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _do_across_processes(self, key, compute, load):
+        waiting_on = None
+        while True:
+            lease = self.db_manager.get_lease(key)
+            if lease and lease["owner"] == waiting_on and lease["error"]:
+                raise SingleFlightError(lease["error"])
+
+            result = load()
+            if result is not None:
+                return result
+
+            if self.db_manager.acquire_lease(key, self.owner, self.lease_seconds):
+                return self._compute_with_lease(key, compute)
+
+            lease = self.db_manager.get_lease(key)
+            waiting_on = lease["owner"] if lease else None
+            time.sleep(self.poll_interval)
+
+    def _compute_with_lease(self, key, compute):
+        # Keep renewing the lease while computing so slow work is not taken over
+        stopped = threading.Event()
+
+        def heartbeat():
+            while not stopped.wait(self.lease_seconds / 3):
+                self.db_manager.renew_lease(key, self.owner, self.lease_seconds)
+
+        threading.Thread(target=heartbeat, daemon=True).start()
+        try:
+            result = compute()
+        except Exception as e:
+            self.db_manager.fail_lease(key, self.owner, str(e))
+            raise
+        finally:
+            stopped.set()
+        self.db_manager.release_lease(key, self.owner)
+        return result
+
+    async def _ado_across_processes(self, key, compute, load):
+        waiting_on = None
+        while True:
+            lease = await asyncio.to_thread(self.db_manager.get_lease, key)
+            if lease and lease["owner"] == waiting_on and lease["error"]:
+                raise SingleFlightError(lease["error"])
+
+            result = await asyncio.to_thread(load)
+            if result is not None:
+                return result
+
+            if await asyncio.to_thread(self.db_manager.acquire_lease, key, self.owner, self.lease_seconds):
+                return await self._acompute_with_lease(key, compute)
+
+            lease = await asyncio.to_thread(self.db_manager.get_lease, key)
+            waiting_on = lease["owner"] if lease else None
+            await asyncio.sleep(self.poll_interval)
+
+    async def _acompute_with_lease(self, key, compute):
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(self.lease_seconds / 3)
+                await asyncio.to_thread(self.db_manager.renew_lease, key, self.owner, self.lease_seconds)
+
+        heartbeat_task = asyncio.create_task(heartbeat())
+        try:
+            result = await compute()
+        except BaseException as e:
+            await asyncio.to_thread(self.db_manager.fail_lease, key, self.owner, str(e) or type(e).__name__)
+            raise
+        finally:
+            heartbeat_task.cancel()
+        await asyncio.to_thread(self.db_manager.release_lease, key, self.owner)
+        return result
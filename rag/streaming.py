@@ -0,0 +1,155 @@
+import json
+import re
+
+
+def filter_think_tags(response_content):
+    """
+    Filters out <think> tags and their content from the response text.
+
+    Args:
+        response_content (str): Text containing potential <think> tags
+
+    Returns:
+        str: Text with <think> tags and their content removed
+    """
+    pattern = r'<think>.*?</think>\s*'
+    filtered_content = re.sub(pattern, '', response_content, flags=re.DOTALL)
+    return filtered_content.strip()
+
+
+class ThinkTagFilter:
+    """
+    Incrementally removes <think>...</think> spans from streamed text.
+
+    Text is fed in arbitrary pieces as it arrives from the model. Anything that
+    might be the start of a tag is held back until the next piece decides it,
+    so tags split across pieces are still removed. The joined output equals
+    filter_think_tags() of the whole text: whitespace after a closing tag is
+    dropped, an unclosed <think> is kept as text, and leading and trailing
+    whitespace is stripped, so trailing whitespace is held back until more
+    text follows it.
+    """
+
+    open_tag = "<think>"
+    close_tag = "</think>"
+
+    def __init__(self):
+        self._buffer = ""
+        self._in_think = False
+        self._skip_whitespace = True
+        self._pending_whitespace = ""
+        # Position in the buffer up to which no closing tag starts
+        self._scanned = 0
+
+    @staticmethod
+    def _partial_tag_length(text, tag):
+        """Length of the longest suffix of text that is a prefix of tag."""
+        for length in range(min(len(tag) - 1, len(text)), 0, -1):
+            if text.endswith(tag[:length]):
+                return length
+        return 0
+
+    def _emit(self, text):
+        if self._skip_whitespace:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._skip_whitespace = False
+        text = self._pending_whitespace + text
+        visible = text.rstrip()
+        self._pending_whitespace = text[len(visible):]
+        return visible
+
+    def feed(self, text):
+        """Add a piece of model output and return the text safe to show."""
+        self._buffer += text
+        output = []
+        while True:
+            if self._in_think:
+                # The think text is kept until its closing tag, in case it never comes
+                end = self._buffer.find(self.close_tag, self._scanned)
+                if end == -1:
+                    self._scanned = max(0, len(self._buffer) - len(self.close_tag) + 1)
+                    break
+                self._buffer = self._buffer[end + len(self.close_tag):]
+                self._in_think = False
+                self._skip_whitespace = True
+            else:
+                start = self._buffer.find(self.open_tag)
+                if start == -1:
+                    keep = self._partial_tag_length(self._buffer, self.open_tag)
+                    output.append(self._emit(self._buffer[:len(self._buffer) - keep]))
+                    self._buffer = self._buffer[len(self._buffer) - keep:]
+                    break
+                output.append(self._emit(self._buffer[:start]))
+                self._buffer = self._buffer[start + len(self.open_tag):]
+                self._in_think = True
+                self._scanned = 0
+        return "".join(output)
+
+    def flush(self):
+        """Return any held-back text once the stream has ended."""
+        text = self.open_tag + self._buffer if self._in_think else self._buffer
+        self._buffer = ""
+        self._in_think = False
+        # Trailing whitespace of the whole response is dropped
+        text = self._emit(text)
+        self._pending_whitespace = ""
+        return text
+
+
+def filter_think_stream(tokens):
+    """Yield tokens from a stream with <think> spans removed on the fly."""
+    think_filter = ThinkTagFilter()
+    for token in tokens:
+        text = think_filter.feed(token)
+        if text:
+            yield text
+    text = think_filter.flush()
+    if text:
+        yield text
+
+
+async def afilter_think_stream(tokens):
+    """Async version of filter_think_stream for an async token iterator."""
+    think_filter = ThinkTagFilter()
+    async for token in tokens:
+        text = think_filter.feed(token)
+        if text:
+            yield text
+    text = think_filter.flush()
+    if text:
+        yield text
+
+
+def sse_event(data, event=None):
+    """Format a JSON payload as a Server-Sent Event."""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+def sse_stream(tokens):
+    """
+    Wrap a token stream as Server-Sent Events.
+
+    Each token is sent as a {"token": ...} message, followed by a final "done"
+    event, or an "error" event if the stream raises.
+    """
+    try:
+        for token in tokens:
+            yield sse_event({"token": token})
+        yield sse_event({}, event="done")
+    except Exception as e:
+        print(e)
+        yield sse_event({"error": str(e)}, event="error")
+
+
+async def asse_stream(tokens):
+    """Async version of sse_stream for an async token iterator."""
+    try:
+        async for token in tokens:
+            yield sse_event({"token": token})
+        yield sse_event({}, event="done")
+    except Exception as e:
+        print(e)
+        yield sse_event({"error": str(e)}, event="error")
@@ -1,11 +1,18 @@
+import os
 from pydantic import BaseModel, Field
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
-from models import Models
+from models import get_models
 from prompts import SUMMARY_TEMPLATE
-model = Models()
+from llm_cache import cached_llm
+model = get_models()
 summary_model = model.summary_model
 
+# Concurrency settings for batch summarization
+summary_max_workers = int(os.environ.get("SUMMARY_MAX_WORKERS", 8))
+summary_max_in_flight = int(os.environ.get("SUMMARY_MAX_IN_FLIGHT", 64))
+summary_max_retries = int(os.environ.get("SUMMARY_MAX_RETRIES", 3))
+
 
 class Summary(BaseModel):
     topic: str = Field(..., description="The main topic of the chunk")
@@ -18,7 +25,7 @@ prompt = SUMMARY_TEMPLATE.partial(
     format_instructions=parser.get_format_instructions()
 )
 
-chain = prompt | summary_model | parser
+chain = prompt | cached_llm(summary_model, "summary", parser)
 
 def summarize_chunk(text):
     """
@@ -36,6 +43,48 @@ def summarize_chunk(text):
     except Exception as e:
         return {"error": str(e)}
 
+def summarize_chunks(texts, max_workers=None, max_in_flight=None, max_retries=None, on_progress=None):
+    """
+    Summarize many chunks concurrently, preserving input order.
+
+    Chunks are submitted in windows of `max_in_flight` so a large document
+    never queues thousands of requests at once, and each window runs on
+    `max_workers` threads. Every chunk is retried up to `max_retries` times
+    before its error is reported.
+
+    Args:
+        texts (list[str]): The chunk texts to summarize.
+        max_workers (int): Number of concurrent summary requests.
+        max_in_flight (int): Maximum number of chunks submitted at once.
+        max_retries (int): Attempts per chunk before giving up.
+        on_progress (callable): Called with the number of chunks done so far
+            after each window completes.
+
+    Returns:
+        list: One Summary (or {"error": ...} dict) per input text, in order.
+    """
+    max_workers = max_workers or summary_max_workers
+    max_in_flight = max_in_flight or summary_max_in_flight
+    max_retries = max_retries or summary_max_retries
+
+    retrying_chain = chain.with_retry(stop_after_attempt=max_retries)
+    results = []
+    for start in range(0, len(texts), max_in_flight):
+        window = [{"text": text} for text in texts[start:start + max_in_flight]]
+        outputs = retrying_chain.batch(
+            window,
+            config={"max_concurrency": max_workers},
+            return_exceptions=True,
+        )
+        for output in outputs:
+            if isinstance(output, Exception):
+                results.append({"error": str(output)})
+            else:
+                results.append(output)
+        if on_progress:
+            on_progress(len(results))
+    return results
+
 # Example usage
 if __name__ == "__main__":
     text_to_summarize = """
@@ -0,0 +1,41 @@
+import time
+
+from db_manager import DBManager
+
+
+def make_db(tmp_path):
+    return DBManager(db_path=str(tmp_path / "roadmaps.db"))
+
+
+def test_unfinished_job_is_claimed_by_one_worker(tmp_path):
+    db = make_db(tmp_path)
+    db.create_ingest_job("job", "a.pdf", "uploads/a.pdf", "collection", owner="worker-1", lease_seconds=60)
+
+    # The job's process is alive, so nobody else resumes it
+    assert db.get_unfinished_ingest_jobs() == []
+    assert not db.claim_ingest_job("job", "worker-2", 60)
+    assert db.claim_ingest_job("job", "worker-1", 60, status="running")
+
+
+def test_job_with_expired_lease_is_resumed_once(tmp_path):
+    db = make_db(tmp_path)
+    db.create_ingest_job("job", "a.pdf", "uploads/a.pdf", "collection", owner="worker-1", lease_seconds=-1)
+
+    assert [job["job_id"] for job in db.get_unfinished_ingest_jobs()] == ["job"]
+    assert db.claim_ingest_job("job", "worker-2", 60)
+    assert not db.claim_ingest_job("job", "worker-3", 60)
+    assert db.get_unfinished_ingest_jobs() == []
+
+    # The old owner lost the job and must not run it
+    assert not db.claim_ingest_job("job", "worker-1", 60, status="running")
+
+
+def test_leases_are_renewed_until_the_job_finishes(tmp_path):
+    db = make_db(tmp_path)
+    db.create_ingest_job("job", "a.pdf", "uploads/a.pdf", "collection", owner="worker-1", lease_seconds=0.05)
+    time.sleep(0.1)
+    db.renew_ingest_leases("worker-1", 60)
+    assert db.get_unfinished_ingest_jobs() == []
+
+    db.update_ingest_job("job", status="completed")
+    assert not db.claim_ingest_job("job", "worker-2", 60)
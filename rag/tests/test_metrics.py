@@ -0,0 +1,31 @@
+import contextvars
+import json
+import time
+
+import metrics
+
+
+def test_streamed_request_is_finished_when_its_body_closes(capsys):
+    stats = metrics.start_request("streamed")
+
+    def tokens():
+        time.sleep(0.05)
+        metrics.record_stage("retrieval", 0.01)
+        metrics.record_chain("chat", 0.02, cached=True)
+        yield "data: token\n\n"
+
+    # after_request runs before the body is sent, and may run in another context
+    body = metrics.StreamedResponseBody(tokens(), stats, "POST", "/chat", 200)
+    assert capsys.readouterr().out == ""
+
+    chunks = contextvars.Context().run(lambda: list(body))
+    assert chunks == ["data: token\n\n"]
+    body.close()
+    body.close()
+
+    logs = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert len(logs) == 1
+    assert logs[0]["request_id"] == "streamed"
+    assert logs[0]["duration_ms"] >= 50
+    assert logs[0]["stages_ms"] == {"retrieval": 10.0}
+    assert logs[0]["llm_cache_hits"] == 1
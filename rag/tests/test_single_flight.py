@@ -0,0 +1,34 @@
+import asyncio
+import sqlite3
+import time
+
+from db_manager import DBManager
+from single_flight import SingleFlight
+
+
+def test_contended_lease_does_not_block_other_requests(tmp_path):
+    db_path = str(tmp_path / "roadmaps.db")
+    single_flight = SingleFlight(DBManager(db_path=db_path), poll_interval=0.01)
+
+    # Another process holds the write lock, so acquiring the lease waits on the busy timeout
+    blocker = sqlite3.connect(db_path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+
+    async def compute():
+        return "roadmap"
+
+    async def other_request():
+        start = time.perf_counter()
+        await asyncio.sleep(0.1)
+        return time.perf_counter() - start
+
+    async def main():
+        leader = asyncio.create_task(single_flight.ado("roadmap:a", compute, lambda: None))
+        served_in = await other_request()
+        assert not leader.done()
+        blocker.execute("COMMIT")
+        return served_in, await leader
+
+    served_in, result = asyncio.run(main())
+    assert served_in < 1
+    assert result == "roadmap"
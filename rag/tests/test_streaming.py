@@ -0,0 +1,42 @@
+import itertools
+
+import pytest
+
+from streaming import filter_think_stream, filter_think_tags
+
+responses = [
+    "Plain answer",
+    "  <think>reasoning</think>\n\nThe answer.  ",
+    "Before <think>a</think> middle <think>b</think>\tafter",
+    "<think>never closed",
+    "Answer <think>unclosed thoughts\n",
+    "<think>one</think>  <think>two",
+    "<think>outer <think>inner</think> rest</think> tail",
+    "a </think> b <thi",
+    "Spaces   \n  kept inside  \n",
+    "<think></think>",
+    "",
+]
+
+
+def stream(text, sizes):
+    """Split text into pieces with the given repeating sizes."""
+    pieces, position = [], 0
+    for size in itertools.cycle(sizes):
+        if position >= len(text):
+            return pieces
+        pieces.append(text[position:position + size])
+        position += size
+
+
+@pytest.mark.parametrize("text", responses)
+@pytest.mark.parametrize("sizes", [(1,), (2,), (3,), (5, 1), (7,), (1000,)])
+def test_streamed_output_matches_filter_think_tags(text, sizes):
+    assert "".join(filter_think_stream(stream(text, sizes))) == filter_think_tags(text)
+
+
+@pytest.mark.parametrize("text", responses)
+def test_every_single_split_matches_filter_think_tags(text):
+    for split in range(len(text) + 1):
+        pieces = [text[:split], text[split:]]
+        assert "".join(filter_think_stream(pieces)) == filter_think_tags(text)
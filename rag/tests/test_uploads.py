@@ -0,0 +1,47 @@
+from db_manager import DBManager
+
+
+def make_db(tmp_path):
+    return DBManager(db_path=str(tmp_path / "roadmaps.db"))
+
+
+def test_reuploaded_content_never_shares_a_collection(tmp_path):
+    db = make_db(tmp_path)
+    old = db.register_upload("a.pdf", "old-fingerprint")
+    db.create_ingest_job("job-old", "a.pdf", "uploads/a.pdf", old["collection_name"], "old-fingerprint")
+
+    # The revised file takes over the old collection for incremental re-ingest
+    new = db.register_upload("a.pdf", "new-fingerprint")
+    assert new["collection_name"] == old["collection_name"]
+
+    # The old bytes uploaded again under another name get a collection of their own
+    again = db.register_upload("x.pdf", "old-fingerprint")
+    assert again["ingest_pending"]
+    assert again["collection_name"] != new["collection_name"]
+    assert db.get_upload("a.pdf")["collection_name"] == new["collection_name"]
+    assert db.get_upload("x.pdf")["collection_name"] == again["collection_name"]
+
+
+def test_upload_failing_before_its_job_is_queued_is_retried(tmp_path):
+    db = make_db(tmp_path)
+    upload = db.register_upload("a.pdf", "fingerprint")
+    assert upload["ingest_pending"]
+
+    # The request failed before creating the job, so the content is still pending
+    retry = db.get_upload("a.pdf")
+    assert retry["ingest_pending"]
+    assert db.register_upload("b.pdf", "fingerprint")["ingest_pending"]
+
+    # Only one of several uploads of the same content queues it
+    assert db.create_ingest_job("job-1", "a.pdf", "uploads/a.pdf", retry["collection_name"], "fingerprint")
+    assert not db.create_ingest_job("job-2", "b.pdf", "uploads/b.pdf", retry["collection_name"], "fingerprint")
+    assert not db.get_upload("a.pdf")["ingest_pending"]
+    assert db.get_latest_ingest_job(retry["collection_name"])["job_id"] == "job-1"
+
+
+def test_legacy_upload_is_not_pending(tmp_path):
+    db = make_db(tmp_path)
+    upload = db.adopt_legacy_upload("old.pdf", "fingerprint", "old_pdf")
+    assert upload["collection_name"] == "old_pdf"
+    assert not upload["ingest_pending"]
+    assert not db.get_upload("old.pdf")["ingest_pending"]
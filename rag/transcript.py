@@ -2,10 +2,10 @@ from pathlib import Path
 from openai import OpenAI
 
 from ingest import initialize_vector_store, return_chunk_by_id
-from model import Models
+from models import get_models
 from prompts import TRANSCRIPT_TEMPLATE
 
-models = Models
+models = get_models()
 transcript_model = models.transcript_model
 chain = TRANSCRIPT_TEMPLATE | transcript_model
 
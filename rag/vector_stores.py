@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import chromadb
+from dotenv import load_dotenv
+from langchain_chroma import Chroma
+
+from answer_cache import answer_cache
+from lexical_index import lexical_index
+from models import get_models
+from numpy_store import NumpyVectorStore
+
+load_dotenv()
+
+# Constants
+persist_directory = "./db/chrome_langchain_db"
+# "chroma", or "numpy" for memory-mapped embedding matrices
+vector_store_backend = os.environ.get("VECTOR_STORE_BACKEND", "chroma")
+vector_store_cache_size = int(os.environ.get("VECTOR_STORE_CACHE_SIZE", 32))
+vector_store_idle_timeout = int(os.environ.get("VECTOR_STORE_IDLE_SECONDS", 600))
+
+
+class VectorStoreCache:
+    """
+    Thread-safe LRU cache of open vector store handles, keyed by collection name.
+
+    With the Chroma backend all handles share one Chroma client, so opening a
+    collection only costs a collection lookup; with the NumPy backend a handle
+    memory-maps the collection's files. Handles unused for `idle_timeout`
+    seconds, or beyond `max_size` entries, are dropped; close() shuts the
+    shared client down.
+    """
+
+    def __init__(self, max_size=vector_store_cache_size, idle_timeout=vector_store_idle_timeout, backend=vector_store_backend):
+        if backend not in ("chroma", "numpy"):
+            raise ValueError(f"Unknown vector store backend: {backend}")
+        self.backend = backend
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._stores = OrderedDict()
+        self._lock = threading.Lock()
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = chromadb.PersistentClient(path=persist_directory)
+        return self._client
+
+    def _open(self, collection_name):
+        if self.backend == "numpy":
+            return NumpyVectorStore(collection_name, get_models().embeddings_model)
+        return Chroma(
+            client=self._get_client(),
+            collection_name=collection_name,
+            embedding_function=get_models().embeddings_model,
+        )
+
+    def _evict_idle(self, now):
+        while self._stores:
+            name, (_, last_used) = next(iter(self._stores.items()))
+            if now - last_used < self.idle_timeout:
+                break
+            del self._stores[name]
+
+    def get(self, collection_name):
+        """Return the open store for a collection, opening it if needed."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            if collection_name in self._stores:
+                store, _ = self._stores.pop(collection_name)
+            else:
+                store = self._open(collection_name)
+            self._stores[collection_name] = (store, now)
+            while len(self._stores) > self.max_size:
+                self._stores.popitem(last=False)
+            return store
+
+    def evict(self, collection_name):
+        """Drop a collection's handle so the next get() reopens it."""
+        with self._lock:
+            self._stores.pop(collection_name, None)
+
+    def delete(self, collection_name):
+        """Drop a collection's handle and delete the collection, its lexical index and cached answers."""
+        with self._lock:
+            entry = self._stores.pop(collection_name, None)
+            if self.backend == "numpy":
+                store = entry[0] if entry else NumpyVectorStore(collection_name, None)
+                store.delete_collection()
+            else:
+                self._get_client().delete_collection(collection_name)
+        lexical_index.drop(collection_name)
+        answer_cache.invalidate(collection_name)
+
+    def close(self):
+        """Drop every handle and shut down the shared Chroma client."""
+        with self._lock:
+            self._stores.clear()
+            if self._client is not None:
+                self._client.clear_system_cache()
+                self._client = None
+
+
+vector_store_cache = VectorStoreCache()
+
+def initialize_vector_store(collection_name="documents"):
+    return vector_store_cache.get(collection_name)
+
+def close_vector_stores():
+    vector_store_cache.close()
+
+def delete_vector_store(collection_name):
+    vector_store_cache.delete(collection_name)
+
+def collection_name_of(vector_store):
+    """Return the name of the collection behind a store from either backend."""
+    if isinstance(vector_store, NumpyVectorStore):
+        return vector_store.collection_name
+    return vector_store._collection.name